@@ -3,79 +3,83 @@
 # Telegram Group: http://t.me/cyberclans
 # Please give me credits if you use any codes from here.
 
-from apiclient.discovery import build
-import pandas as pd
+from googleapiclient.errors import HttpError
+from contextlib import aclosing
+import asyncio
+import sys
 import configparser
-
-# Read config.data for API Key and Video ID
-cpass = configparser.RawConfigParser()
-cpass.read('config.data')
-
-Api_Key = cpass.get('cred', 'id')
-Video_ID = cpass.get('cred', 'hash')
-
-youtube = build('youtube', 'v3', developerKey=Api_Key)
-
-List = [['Name', 'Comment', 'Likes', 'Time', 'Reply Count']]
-
-def scrape_all_with_replies():
-    data = youtube.commentThreads().list(part='snippet', videoId=Video_ID, maxResults='100', textFormat="plainText").execute()
-
-    for i in data["items"]:
-        name = i["snippet"]['topLevelComment']["snippet"]["authorDisplayName"]
-        comment = i["snippet"]['topLevelComment']["snippet"]["textDisplay"]
-        likes = i["snippet"]['topLevelComment']["snippet"]['likeCount']
-        published_at = i["snippet"]['topLevelComment']["snippet"]['publishedAt']
-        replies = i["snippet"]['totalReplyCount']
-
-        List.append([name, comment, likes, published_at, replies])
-
-        total_reply_count = i["snippet"]['totalReplyCount']
-
-        if total_reply_count > 0:
-            parent = i["snippet"]['topLevelComment']["id"]
-            data2 = youtube.comments().list(part='snippet', maxResults='100', parentId=parent, textFormat="plainText").execute()
-
-            for j in data2["items"]:
-                name = j["snippet"]["authorDisplayName"]
-                comment = j["snippet"]["textDisplay"]
-                likes = j["snippet"]['likeCount']
-                published_at = j["snippet"]['publishedAt']
-                replies = ""
-
-                List.append([name, comment, likes, published_at, replies])
-
-    while "nextPageToken" in data:
-        data = youtube.commentThreads().list(part='snippet', videoId=Video_ID, pageToken=data["nextPageToken"], maxResults='100', textFormat="plainText").execute()
-
-        for i in data["items"]:
-            name = i["snippet"]['topLevelComment']["snippet"]["authorDisplayName"]
-            comment = i["snippet"]['topLevelComment']["snippet"]["textDisplay"]
-            likes = i["snippet"]['topLevelComment']["snippet"]['likeCount']
-            published_at = i["snippet"]['topLevelComment']["snippet"]['publishedAt']
-            replies = i["snippet"]['totalReplyCount']
-
-            List.append([name, comment, likes, published_at, replies])
-
-            total_reply_count = i["snippet"]['totalReplyCount']
-
-            if total_reply_count > 0:
-                parent = i["snippet"]['topLevelComment']["id"]
-                data2 = youtube.comments().list(part='snippet', maxResults='100', parentId=parent, textFormat="plainText").execute()
-
-                for j in data2["items"]:
-                    name = j["snippet"]["authorDisplayName"]
-                    comment = j["snippet"]["textDisplay"]
-                    likes = j["snippet"]['likeCount']
-                    published_at = j["snippet"]['publishedAt']
-                    replies = ''
-
-                    List.append([name, comment, likes, published_at, replies])
-
-    df = pd.DataFrame({'Name': [i[0] for i in List], 'Comment': [i[1] for i in List], 'Likes': [i[2] for i in List], 'Time': [i[3] for i in List], 'Reply Count': [i[4] for i in List]})
-
-    df.to_csv('YT-Scrape-Result.csv', index=False, header=False)
-
-    return "Successful! Check the CSV file that you have just created."
-
-scrape_all_with_replies()
+from comment_sink import open_sink
+from checkpoint import CheckpointStore, DEFAULT_CHECKPOINT_PATH
+from request_scheduler import RequestScheduler, QuotaExhaustedError, DEFAULT_DAILY_QUOTA, DEFAULT_QUOTA_PATH
+from response_cache import ResponseCache, DEFAULT_CACHE_PATH
+from async_youtube import AsyncYouTube, iter_comment_pages
+from instrumentation import METRICS, span, increment
+from youtube_api import COMMENT_COLUMNS
+
+# Writes a video's comment pages to the sink, replaying checkpointed pages first
+async def scrape_pages(client, video_id, sink, checkpoints, key, max_workers):
+    state = checkpoints.load(key) if checkpoints else None
+    page = 0
+    page_token = None
+    if state:
+        print(f"[+] Resuming from checkpoint: {state['pages']} pages, {state['rows']} rows")
+        for rows in checkpoints.iter_pages(key):
+            sink.write_rows(rows)
+            page += 1
+        page_token = state['next_page_token']
+        if not page_token:
+            return
+
+    # The page loop keeps paging while up to max_workers earlier pages complete their replies; rows are written in page order
+    pages = iter_comment_pages(client, video_id, page_token, text_format="plainText", reply_count='', lookahead=max_workers)
+    async with aclosing(pages):
+        async for rows, next_page_token in pages:
+            sink.write_rows(rows)
+            if checkpoints:
+                checkpoints.save_page(key, page, rows, next_page_token)
+            page += 1
+            increment('pages', scraper='cli')
+            increment('rows', len(rows), scraper='cli')
+
+def scrape_all_with_replies(api_key, video_id, max_workers=8, api_endpoint=None, output='YT-Scrape-Result.csv', checkpoint_path=DEFAULT_CHECKPOINT_PATH, scheduler=None, cache=None):
+    client = AsyncYouTube(api_key, cache=cache, scheduler=scheduler, api_endpoint=api_endpoint)
+    checkpoints = CheckpointStore(checkpoint_path) if checkpoint_path else None
+    key = f'cli:{video_id}'
+
+    try:
+        with open_sink(output, COMMENT_COLUMNS) as sink, span('scrape', scraper='cli'):
+            asyncio.run(scrape_pages(client, video_id, sink, checkpoints, key, max_workers))
+        if checkpoints:
+            checkpoints.finish(key)
+    finally:
+        if checkpoints:
+            checkpoints.close()
+
+    return "Successful! Check the output file that you have just created."
+
+if __name__ == '__main__':
+    # Read config.data for API Key and Video ID
+    cpass = configparser.RawConfigParser()
+    cpass.read('config.data')
+
+    Api_Key = cpass.get('cred', 'id')
+    Video_ID = cpass.get('cred', 'hash')
+    Max_Workers = cpass.getint('cred', 'workers', fallback=8)
+    Output = cpass.get('cred', 'output', fallback='YT-Scrape-Result.csv')
+    Checkpoint = cpass.get('cred', 'checkpoint', fallback=DEFAULT_CHECKPOINT_PATH)
+    Metrics_Path = cpass.get('cred', 'metrics', fallback=None)
+    Cache = ResponseCache(cpass.get('cred', 'cache', fallback=DEFAULT_CACHE_PATH))
+    Scheduler = RequestScheduler(qps=cpass.getfloat('cred', 'qps', fallback=10.0), daily_quota=cpass.getint('cred', 'quota', fallback=DEFAULT_DAILY_QUOTA), state_path=DEFAULT_QUOTA_PATH)
+
+    try:
+        print(scrape_all_with_replies(Api_Key, Video_ID, max_workers=Max_Workers, output=Output, checkpoint_path=Checkpoint, scheduler=Scheduler, cache=Cache))
+    except (HttpError, QuotaExhaustedError) as e:
+        print(f"[!] HTTP error occurred: {e}")
+        print("[!] Progress is saved; run the scraper again to resume from the last completed page.")
+        sys.exit(1)
+    finally:
+        Metrics = Scheduler.metrics()
+        print(f"[+] Quota used: {Metrics['quota_used']} units, {Metrics['quota_remaining']} remaining today ({Metrics['requests']} requests, {Metrics['retries']} retries)")
+        if Metrics_Path:
+            METRICS.write(Metrics_Path)
+            print(f"[+] Stage timings and counters written to {Metrics_Path}")
@@ -1,27 +1,34 @@
+# Plotting, NLP and Gemini libraries are imported inside the panels that use them,
+# so a cold start only loads Streamlit, pandas and the YouTube client.
+import asyncio
+import functools
+import hashlib
 import logging
-import re
+import tempfile
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from pandas import to_datetime
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from textblob import TextBlob
-from wordcloud import WordCloud
-import gensim
-import plotly.express as px
+from sentiment import analyze_sentiments
+from text_features import FeatureCache
 import streamlit as st
-from st_aggrid import AgGrid, GridUpdateMode, DataReturnMode
-from st_aggrid.grid_options_builder import GridOptionsBuilder
-from gensim import corpora
-import google.generativeai as genai
+from youtube_api import extract_video_id, COMMENT_COLUMNS
+from async_youtube import AsyncYouTube
+from response_cache import ResponseCache
+from request_scheduler import RequestScheduler, DEFAULT_QUOTA_PATH
+from comment_store import CommentStore, SORT_COLUMNS
+from comment_frame import sentiment_categorical
+from scrape_jobs import ScrapeJob
+from summarizer import summarize_comments
+from dedup import collapse_duplicates
+from word_counts import WordCountCache
+from batch_scraper import BatchScraper, resolve_targets
+from instrumentation import METRICS, timed
 
 # Load API key from Streamlit secrets
 gemini_api_key = st.secrets["general"]["GEMINI_API_KEY"]
 youtube_api_key = st.secrets["general"]["YOUTUBE_API_KEY"]
-
-# Configure Gemini
-genai.configure(api_key=gemini_api_key)
+# Optional overrides, e.g. to run the app against fake_youtube_api.py for benchmarks
+youtube_api_endpoint = st.secrets["general"].get("YOUTUBE_API_ENDPOINT")
+youtube_qps = float(st.secrets["general"].get("YOUTUBE_QPS", 10.0))
 
 generation_config = {
     "temperature": 0.7,
@@ -30,114 +37,116 @@ generation_config = {
     "max_output_tokens": 8192,
     "response_mime_type": "text/plain",
 }
-model = genai.GenerativeModel(model_name="gemini-1.5-flash", generation_config=generation_config,)
-chat_session = model.start_chat()
+
+# Trending videos are re-fetched at most this often (seconds)
+TRENDING_TTL = 900
+# How often the UI polls a running scrape job (seconds)
+JOB_POLL_SECONDS = 1.0
+
+# Comments sampled when a topic preview is requested
+TOPIC_PREVIEW_SIZE = 2000
+
+# Rows sent to the browser per table page, and rows encoded per step of a CSV download
+TABLE_PAGE_SIZE = 50
+CSV_CHUNK_SIZE = 10000
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Function to extract video ID from YouTube URL
-def extract_video_id(url):
-    patterns = [
-        r"(?<=v=)[^&]+",
-        r"(?<=be\/)[^?]+",
-        r"(?<=embed\/)[^\"?]+",
-        r"(?<=youtu.be\/)[^\"?]+"
-    ]
-    for pattern in patterns:
-        video_id = re.search(pattern, url)
-        if video_id:
-            return video_id.group(0)
-    return None
-
-# Function to perform sentiment analysis using TextBlob
-def analyze_sentiment(comment):
-    analysis = TextBlob(comment)
-    if analysis.sentiment.polarity > 0:
-        return 'Positive'
-    elif analysis.sentiment.polarity == 0:
-        return 'Neutral'
+# Function to get the on-disk API response cache, shared across Streamlit reruns and sessions
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache()
+
+# Function to get the request scheduler that paces YouTube calls and tracks quota for the whole app
+@st.cache_resource
+def get_request_scheduler():
+    return RequestScheduler(qps=youtube_qps, state_path=DEFAULT_QUOTA_PATH)
+
+# Function to configure Gemini and build the model once per process, the first time a summary is requested
+@st.cache_resource
+def get_gemini_model():
+    import google.generativeai as genai
+    genai.configure(api_key=gemini_api_key)
+    return genai.GenerativeModel(model_name="gemini-1.5-flash", generation_config=generation_config,)
+
+# Function to get the persistent per-comment feature cache (sentiment labels, tokens)
+@st.cache_resource
+def get_feature_cache():
+    return FeatureCache()
+
+# Function to get the per-video word count cache behind the word cloud
+@st.cache_resource
+def get_word_count_cache():
+    return WordCountCache()
+
+# Function to get the indexed comment store every scrape is upserted into
+@st.cache_resource
+def get_comment_store():
+    return CommentStore()
+
+# Function to create a scrape job wired to the app's shared caches, scheduler and comment store.
+# With since set, threads are read newest first and paging stops at the first one not newer than it.
+def make_scrape_job(youtube_api_key, video_id, output_path=None, since=None, sentiment_backend="textblob"):
+    return ScrapeJob(youtube_api_key, video_id, since=since, sentiment_backend=sentiment_backend, output_path=output_path,
+                     response_cache=get_response_cache(), scheduler=get_request_scheduler(), store=get_comment_store(), feature_cache=get_feature_cache(),
+                     api_endpoint=youtube_api_endpoint)
+
+# Function to report a failed scrape job
+def show_job_error(job):
+    if isinstance(job.error, HttpError):
+        st.error(f"HTTP error occurred: {job.error}. Progress was saved; scrape again to resume.")
     else:
-        return 'Negative'
+        st.error(f"Error scraping comments: {job.error}")
 
-# Function to scrape YouTube comments
-def scrape_youtube_comments(youtube_api_key, video_id):
-    youtube = build('youtube', 'v3', developerKey=youtube_api_key, cache_discovery=False)
-    comments = []
-    try:
-        next_page_token = None
-        page_count = 0
-        progress_bar = st.progress(0)
-        while True:
-            request = youtube.commentThreads().list(
-                part="snippet,replies",
-                videoId=video_id,
-                maxResults=100,
-                pageToken=next_page_token
-            )
-            response = request.execute()
-
-            for item in response["items"]:
-                comment = item["snippet"]["topLevelComment"]["snippet"]
-                comments.append([
-                    comment["authorDisplayName"],
-                    comment["textDisplay"],
-                    comment["likeCount"],
-                    comment["publishedAt"],
-                    item["snippet"]["totalReplyCount"],
-                    analyze_sentiment(comment["textDisplay"])
-                ])
-
-                if "replies" in item:
-                    for reply in item["replies"]["comments"]:
-                        reply_comment = reply["snippet"]
-                        comments.append([
-                            reply_comment["authorDisplayName"],
-                            reply_comment["textDisplay"],
-                            reply_comment["likeCount"],
-                            reply_comment["publishedAt"],
-                            0,
-                            analyze_sentiment(reply_comment["textDisplay"])
-                        ])
-
-            if "nextPageToken" in response:
-                next_page_token = response["nextPageToken"]
-            else:
-                break
-
-            page_count += 1
-            progress_bar.progress(min(page_count / 10, 1.0))
-
-        df = pd.DataFrame(comments, columns=["Name", "Comment", "Likes", "Time", "Reply Count", "Sentiment"])
-        # Convert 'Time' to datetime in the DataFrame
-        df['Time'] = pd.to_datetime(df['Time'], utc=True)  # Convert 'Time' to datetime
-        total_comments = len(comments)
-        return df, total_comments
-
-    except HttpError as e:
-        logging.error(f"HTTP error occurred: {e}")
-        st.error(f"HTTP error occurred: {e}")
-        return None, None
-    except Exception as e:
-        logging.error(f"Error scraping comments: {e}")
-        st.error(f"Error scraping comments: {e}")
+# Function to scrape YouTube comments in the calling thread, optionally streaming every page to a CSV/Parquet file
+def scrape_youtube_comments(youtube_api_key, video_id, output_path=None, since=None, sentiment_backend="textblob"):
+    job = make_scrape_job(youtube_api_key, video_id, output_path, since, sentiment_backend).run()
+    if job.status != "done":
+        show_job_error(job)
         return None, None
+    return job.snapshot(), job.rows
+
+# Function to read every stored comment of a video, with sentiment
+def stored_dataset(video_id, sentiment_backend="textblob"):
+    df = get_comment_store().video_comments(video_id)
+    df['Sentiment'] = sentiment_categorical(analyze_sentiments(df['Comment'], backend=sentiment_backend, cache=get_feature_cache()))
+    return df
 
 def generate_reply(model, chat_session, comment, video_description):
     # TO DO
     pass
 
-# Function to generate a word cloud
-def generate_word_cloud(text, stopwords=None, colormap='viridis', contour_color='steelblue'):
-    wordcloud = WordCloud(width=800, height=400, background_color='white', stopwords=stopwords, colormap=colormap, contour_color=contour_color).generate(text)
+# Function to count a video's word frequencies, skipping stopwords and bare numbers.
+# Counts are saved per video, so after a rescrape only new or grown comment clusters are counted.
+def word_frequencies(video_id, comments, stopwords=None, weights=None):
+    if stopwords is None:
+        from wordcloud import STOPWORDS as stopwords
+    return get_word_count_cache().frequencies(video_id, list(comments), weights, frozenset(stopwords))
+
+# Function to generate a word cloud from raw text or precomputed word frequencies
+@timed('word_cloud')
+def generate_word_cloud(text=None, stopwords=None, colormap='viridis', contour_color='steelblue', frequencies=None):
+    import matplotlib.pyplot as plt
+    from wordcloud import WordCloud
+    wordcloud = WordCloud(width=800, height=400, background_color='white', stopwords=stopwords, colormap=colormap, contour_color=contour_color)
+    if frequencies is not None:
+        if not frequencies:
+            st.write("No words to display.")
+            return
+        wordcloud.generate_from_frequencies(frequencies)
+    else:
+        wordcloud.generate(text)
     plt.figure(figsize=(10, 5))
     plt.imshow(wordcloud, interpolation='bilinear')
     plt.axis('off')
     st.pyplot(plt)
 
-# Function to analyze comment length
-def analyze_comment_length(df):
-    comment_lengths = df["Comment"].str.len()
+# Function to show comment length statistics from the precomputed analytics
+def analyze_comment_length(analytics):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    comment_lengths = analytics["comment_lengths"]
     st.write("Comment Length Statistics:")
     st.write(f"Average Length: {comment_lengths.mean():.2f} characters")
     st.write(f"Median Length: {comment_lengths.median()} characters")
@@ -148,73 +157,125 @@ def analyze_comment_length(df):
     ax.set_title("Comment Length Distribution")
     st.pyplot(fig)
 
-# Function to get top commenters
-def get_top_commenters(df, by="comments", top_n=10):
-    if by == "comments":
-        top_commenters = df["Name"].value_counts().head(top_n)
-    elif by == "likes":
-        top_commenters = df.groupby("Name")["Likes"].sum().sort_values(ascending=False).head(top_n)
-    else:
+# Function to get top commenters of a video from the comment store
+def get_top_commenters(video_id, by="comments", top_n=10):
+    if by not in ("comments", "likes"):
         st.error("Invalid option for 'by'. Choose 'comments' or 'likes'.")
         return
-    st.write(f"Top {top_n} Commenters by {by.capitalize()}:\")")
+    top_commenters = get_comment_store().top_commenters(video_id, by=by, limit=top_n)
+    st.write(f"Top {top_n} Commenters by {by.capitalize()}:")
     st.write(top_commenters)
 
 # Function to export visualization
 def export_visualization(fig, filename):
-    plt.savefig(filename, dpi=300, bbox_inches='tight')
+    fig.savefig(filename, dpi=300, bbox_inches='tight')
     st.success(f"Visualization saved as {filename}")
 
-# Function to analyze sentiment over time
-def analyze_sentiment_over_time(df):
-    df["Date"] = pd.to_datetime(df["Time"]).dt.date
-    df['Time'] = pd.to_datetime(df['Time'])
-    sentiment_over_time = df.groupby(["Date", "Sentiment"]).size().unstack(fill_value=0)
-    fig = px.line(sentiment_over_time, title='Sentiment Over Time')
+# Function to plot sentiment over time from the precomputed analytics, and comment volume from the comment store
+def analyze_sentiment_over_time(analytics, video_id):
+    import plotly.express as px
+    fig = px.line(analytics["sentiment_over_time"], title='Sentiment Over Time')
     st.plotly_chart(fig)
-
-# Function to display an interactive data table
-def display_interactive_table(df):
-    gb = GridOptionsBuilder.from_dataframe(df)
-    gb.configure_pagination(paginationAutoPageSize=True)
-    gb.configure_side_bar()
-    gridOptions = gb.build()
-    AgGrid(df, gridOptions=gridOptions, enable_enterprise_modules=True, update_mode=GridUpdateMode.SELECTION_CHANGED, data_return_mode=DataReturnMode.FILTERED_AND_SORTED)
-
-# Function to extract topics from comments
-def extract_topics(df, num_topics=5, num_words=10):
+    # Sentiment labels are not stored, but volume is an indexed GROUP BY over every stored comment of the video
+    freq = st.radio("Comment volume per", ["day", "hour"], horizontal=True, key="volume_freq")
+    st.line_chart(get_comment_store().comments_over_time(video_id, freq).rename("Comments"))
+
+# Function to display a table one page at a time; the rows stay on the server and only the visible page is sent to the browser.
+# fetch(search, sort, descending, limit, offset) returns the page and the number of rows matching the filter.
+def paged_table(key, sort_columns, fetch, placeholder=None):
+    page_key = f"{key}_page"
+
+    def first_page():
+        st.session_state[page_key] = 1
+
+    search_column, sort_column, order_column = st.columns([2, 1, 1])
+    search = search_column.text_input("Filter", key=f"{key}_search", placeholder=placeholder, on_change=first_page)
+    sort = sort_column.selectbox("Sort by", sort_columns, key=f"{key}_sort", on_change=first_page)
+    descending = order_column.toggle("Descending", value=True, key=f"{key}_descending", on_change=first_page)
+
+    page = st.session_state.get(page_key, 1)
+    rows, total = fetch(search, sort, descending, TABLE_PAGE_SIZE, (page - 1) * TABLE_PAGE_SIZE)
+    pages = max(-(-total // TABLE_PAGE_SIZE), 1)
+    if page > pages:
+        # The filter now matches fewer rows than the page that was open
+        page = st.session_state[page_key] = pages
+        rows, total = fetch(search, sort, descending, TABLE_PAGE_SIZE, (page - 1) * TABLE_PAGE_SIZE)
+
+    st.dataframe(rows, hide_index=True)
+    page_column, count_column = st.columns([1, 3])
+    page_column.number_input("Page", min_value=1, max_value=pages, step=1, key=page_key)
+    start = (page - 1) * TABLE_PAGE_SIZE
+    count_column.caption(f"Rows {start + 1}-{start + len(rows)} of {total}" if total else "No matching rows")
+
+# Function to page an in-memory DataFrame for paged_table, matching the search text against search_columns
+def frame_pages(df, search_columns):
+    def fetch(search, sort, descending, limit, offset):
+        matches = df
+        if search:
+            mask = pd.Series(False, index=df.index)
+            for column in search_columns:
+                mask |= df[column].astype(str).str.contains(search, case=False, regex=False)
+            matches = df[mask]
+        # Categorical columns (e.g. Name) sort by their codes, which follow first appearance; sort them by label
+        matches = matches.sort_values(sort, ascending=not descending, kind="stable",
+                                      key=lambda column: column.astype(str) if isinstance(column.dtype, pd.CategoricalDtype) else column)
+        return matches.iloc[offset:offset + limit], len(matches)
+    return fetch
+
+# Function to page a video's stored comments for paged_table; sorting and filtering run as indexed queries on the comment store
+def stored_comment_pages(video_id, sentiment_backend="textblob"):
+    def fetch(search, sort, descending, limit, offset):
+        rows, total = get_comment_store().comment_page(video_id, search, sort, descending, limit, offset)
+        # Labels come from the feature cache, so a page costs no new sentiment analysis
+        rows['Sentiment'] = sentiment_categorical(analyze_sentiments(rows['Comment'], backend=sentiment_backend, processes=1, cache=get_feature_cache()))
+        return rows, total
+    return fetch
+
+# Function to write a video's stored comments to a temporary CSV file chunk by chunk and return its bytes.
+# Only one chunk of comments is in memory while the file is written; Streamlit reads the result into memory
+# either way, so the bytes are returned and the file is deleted when it is closed.
+def stored_comments_csv(store, feature_cache, video_id, sentiment_backend="textblob", chunk_size=CSV_CHUNK_SIZE):
+    with tempfile.NamedTemporaryFile('w+b', suffix='.csv') as f:
+        for chunk in store.iter_video_comments(video_id, chunk_size):
+            chunk['Sentiment'] = sentiment_categorical(analyze_sentiments(chunk['Comment'], backend=sentiment_backend, processes=1, cache=feature_cache))
+            chunk.to_csv(f, index=False, header=f.tell() == 0, encoding='utf-8')
+        f.seek(0)
+        return f.read()
+
+# Function to extract topics from comments; cached per dataset so reruns do not retrain the model.
+# Full runs update the video's saved model with new comments only; previews train on a sample.
+@st.cache_data(show_spinner="Extracting topics...", max_entries=8)
+def compute_topics(dataset_key, _df, video_id, num_topics=5, num_words=10, preview=False):
+    from topics import sample_topics, video_topics
+    df = _df
     if df['Comment'].isnull().all():
-        st.write("No comments to analyze.")
-        return
-
-    comments = df['Comment'].str.lower().str.split()
-    comments = [comment for comment in comments if comment]
+        return None, "No comments to analyze."
 
-    if not comments:
-        st.write("No valid comments to analyze.")
-        return
-
-    dictionary = corpora.Dictionary(comments)
-    if len(dictionary) == 0:
-        st.write("No tokens found in comments.")
-        return
-
-    corpus = [dictionary.doc2bow(comment) for comment in comments]
-    if not corpus:
-        st.write("No terms in the corpus to analyze.")
+    # Each near-duplicate cluster is one document weighted by its size
+    if preview:
+        lda_model = sample_topics(df['Comment'], num_topics=num_topics, sample_size=TOPIC_PREVIEW_SIZE, weights=df['Count'], cache=get_feature_cache())
+    else:
+        lda_model = video_topics(video_id, df['Comment'], num_topics=num_topics, weights=df['Count'], cache=get_feature_cache())
+    if lda_model is None:
+        return None, "No valid comments to analyze."
+    return lda_model.print_topics(num_words=num_words), None
+
+# Function to display the topics extracted from comments
+def extract_topics(df, dataset_key, video_id, num_topics=5, num_words=10):
+    preview = len(df) > TOPIC_PREVIEW_SIZE and st.checkbox(f"Quick topic preview (sample of {TOPIC_PREVIEW_SIZE} comments)")
+    topics, message = compute_topics(dataset_key, df, video_id, num_topics, num_words, preview)
+    if topics is None:
+        st.write(message)
         return
-
-    lda_model = gensim.models.LdaMulticore(corpus, num_topics=num_topics, id2word=dictionary, passes=10, workers=2)
-    topics = lda_model.print_topics(num_words=num_words)
     st.write("Extracted Topics:")
     for idx, topic in topics:
         st.write(f"Topic {idx + 1}: {topic}")
 
-# Function to get trending videos
+# Function to get trending videos, cached so reruns and sessions share one videos.list call per TTL
+@st.cache_data(ttl=TRENDING_TTL, show_spinner="Loading trending videos...")
 def get_trending_videos(youtube_api_key):
-    youtube = build('youtube', 'v3', developerKey=youtube_api_key, cache_discovery=False)
-    request = youtube.videos().list(part="snippet,statistics", chart="mostPopular", regionCode="US", maxResults=10)
-    response = request.execute()
+    client = AsyncYouTube(youtube_api_key, cache=get_response_cache(), scheduler=get_request_scheduler(), api_endpoint=youtube_api_endpoint)
+    response = asyncio.run(client.videos(part="snippet,statistics", chart="mostPopular", regionCode="US", maxResults=10))
     videos = []
     for item in response["items"]:
         video = {
@@ -236,51 +297,113 @@ def display_video_metadata(video):
     st.write("Like Count:", video["likeCount"])
     st.write("Comment Count:", video["commentCount"])
 
+SENTIMENT_SCORES = {'Positive': 1, 'Negative': -1}
+
 # Function to calculate user engagement score
+@timed('engagement')
 def calculate_engagement(df):
-    df["EngagementScore"] = df["Likes"] + df["Reply Count"] * 2 + df["Sentiment"].apply(lambda x: 1 if x == 'Positive' else (-1 if x == 'Negative' else 0))
+    df["EngagementScore"] = df["Likes"] + df["Reply Count"] * 2 + df["Sentiment"].map(SENTIMENT_SCORES).fillna(0).astype(int)
     return df
 
-# Function to monitor API quota
-def api_quota_monitor(gemini_api_key):
-    genai.configure(api_key=gemini_api_key)  # Configure for Gemini
-    try:
-        # Make a simple request to Gemini to get quota info
-        response = genai.generate_text(
-            model="models/gemini-1.5-flash",  # Use Gemini Pro model
-            prompt="Hello, world!",
-        )
-        return response.get('quota_remaining', None)
-    except HttpError as e:
-        print(f"An HTTP error occurred: {e.resp.status} {e.content}")
-    except Exception as e:
-        print(f"An error occurred: {e}")
-    return None
-
-# Function to summarize comments
-def summarize_comments(model, chat_session, comments):
-    """Summarizes all comments in the list.
-
-    Args:
-        model: The Gemini model object.
-        chat_session: The chat session object.
-        comments: A list of comments to summarize.
-
-    Returns:
-        A string containing the summary of all comments.
-    """
-    if not comments:
-        return "No comments to summarize."
-    
-    # Combine all comments into a single string
-    all_comments = "\n\n".join(comments)
-    prompt = f"Summarize the following YouTube comments:\n\n{all_comments}"
+# Function to compute every aggregate the analysis panels show, in one vectorized pass over the comments.
+# Cached by dataset key, so widget interactions rerun the script without recomputing anything.
+@st.cache_data(show_spinner="Analyzing comments...", max_entries=8)
+def compute_analytics(dataset_key, _df, video_id):
+    df = _df
+    engagement = calculate_engagement(df[["Name", "Comment", "Likes", "Reply Count", "Sentiment"]].copy())
+    # Word cloud, topics and summary run on one representative per near-duplicate cluster.
+    # Clustering oldest first keeps earlier representatives stable when a rescrape adds comments.
+    collapsed = collapse_duplicates(df[["Comment", "Time"]].sort_values("Time", kind="stable"), cache=get_feature_cache())
+    return {
+        "sentiment_counts": df["Sentiment"].value_counts(),
+        "comment_lengths": df["Comment"].str.len(),
+        # Time is already converted to datetime by the scraper
+        "sentiment_over_time": pd.crosstab(df["Time"].dt.date.rename("Date"), df["Sentiment"]),
+        "engagement": engagement[["Name", "Comment", "EngagementScore"]].sort_values(by="EngagementScore", ascending=False),
+        "collapsed": collapsed,
+        "word_frequencies": word_frequencies(video_id, collapsed["Comment"], weights=collapsed["Count"]),
+    }
+
+# Function to identify a scraped dataset for the analytics caches.
+# The content fingerprint changes when a rescrape only edits text or updates like and reply counts.
+def make_dataset_key(video_id, df, sentiment_backend):
+    fingerprint = hashlib.blake2b(pd.util.hash_pandas_object(df[COMMENT_COLUMNS], index=False).values.tobytes(), digest_size=8).hexdigest()
+    return f"{video_id}:{sentiment_backend}:{len(df)}:{fingerprint}"
+
+# Function to summarize a dataset once; reruns reuse the cached summary, and new comments only cost their own chunks.
+# Near-duplicates are sent once, tagged with how often they were posted. Errors propagate, so they are never cached.
+@st.cache_data(show_spinner="Summarizing comments...", max_entries=8)
+def cached_summary(dataset_key, _collapsed):
+    # Oldest first, so comments added by a rescrape land in the last chunks
+    collapsed = _collapsed.sort_values("Time", kind="stable")
+    comments = [f"[posted {count} times] {comment}" if count > 1 else comment for comment, count in zip(collapsed["Comment"], collapsed["Count"])]
+    return summarize_comments(get_gemini_model(), comments, cache=get_feature_cache())
+
+# Function to render every analysis panel for the scraped dataset
+@timed('render_analysis')
+def render_analysis(df, dataset_key, video_id):
+    import matplotlib.pyplot as plt
+    analytics = compute_analytics(dataset_key, df, video_id)
+
+    # Comment Table
+    st.subheader("Comment Table")
+    paged_table("comment_table", list(SORT_COLUMNS), stored_comment_pages(video_id, sentiment_backend), placeholder="Comment or author contains...")
+    # The file is only written when the button is clicked, on Streamlit's download thread
+    st.download_button(label="Download CSV", data=functools.partial(stored_comments_csv, get_comment_store(), get_feature_cache(), video_id, sentiment_backend),
+                       file_name="youtube_comments.csv", mime="text/csv")
+
+    # Sentiment Analysis Visualization
+    st.subheader("Sentiment Analysis")
+    sentiment_counts = analytics["sentiment_counts"]
+    sentiment_counts = sentiment_counts[sentiment_counts > 0]
+    fig, ax = plt.subplots()
+    ax.pie(sentiment_counts, labels=sentiment_counts.index, autopct='%1.1f%%', startangle=140)
+    ax.axis('equal')
+    st.pyplot(fig)
+    export_visualization(fig, "sentiment_analysis.png")
+
+    # Generate Word Cloud
+    st.subheader("Word Cloud")
+    duplicates = len(df) - len(analytics["collapsed"])
+    if duplicates:
+        st.caption(f"{duplicates} near-duplicate comments were collapsed; the word cloud, topics and summary count each cluster by its size.")
+    generate_word_cloud(frequencies=analytics["word_frequencies"])
+
+    # Comment Length Analysis
+    st.subheader("Comment Length Analysis")
+    analyze_comment_length(analytics)
+
+    # Top Commenters
+    st.subheader("Top Commenters")
+    top_commenters_by_comments = st.checkbox("Top Commenters by Number of Comments")
+    top_commenters_by_likes = st.checkbox("Top Commenters by Total Likes")
+    top_n = st.number_input("Number of Top Commenters", min_value=1, value=10, step=1)
+
+    if top_commenters_by_comments:
+        get_top_commenters(video_id, by="comments", top_n=top_n)
+
+    if top_commenters_by_likes:
+        get_top_commenters(video_id, by="likes", top_n=top_n)
+
+    # Sentiment Analysis Over Time
+    st.subheader("Sentiment Analysis Over Time")
+    analyze_sentiment_over_time(analytics, video_id)
+
+    # Topic Extraction
+    st.subheader("Topic Extraction")
+    extract_topics(analytics["collapsed"], dataset_key, video_id)
+
+    # User Engagement Score
+    st.subheader("User Engagement Score")
+    paged_table("engagement_table", ["EngagementScore", "Name"], frame_pages(analytics["engagement"], ["Name", "Comment"]), placeholder="Comment or author contains...")
+
+    # Comment Summary
+    st.subheader("Comment Summary")
     try:
-        response = chat_session.send_message(prompt)
-        return response.text.strip()
+        st.write(cached_summary(dataset_key, analytics["collapsed"]))
     except Exception as e:
         logging.error(f"Error summarizing comments: {e}")
-        return "Error summarizing comments."
+        st.error("Error summarizing comments. Rerun to try again; chunks that were already summarized are kept.")
 
 
 # Streamlit App
@@ -293,79 +416,95 @@ if 'filtered_df' not in st.session_state:
     st.session_state['filtered_df'] = pd.DataFrame()
 
 video_url = st.text_input("Enter YouTube video URL")
+incremental = st.checkbox("Only fetch new comments since the last scrape", help="Merges new comments into the stored comments for this video instead of downloading every comment again.")
+sentiment_backend = st.sidebar.selectbox("Sentiment Engine", ["textblob", "lexicon"], help="'lexicon' uses a precomputed word-score table and is much faster on large videos.")
+
+# Function to start a background scrape; incremental scrapes only fetch comments newer than the stored ones
+def start_scrape(video_id):
+    previous = st.session_state.get('job')
+    if previous is not None:
+        previous.cancel()
+    since = get_comment_store().scraped_until(video_id) if incremental else None
+    st.session_state['job'] = make_scrape_job(youtube_api_key, video_id, since=since, sentiment_backend=sentiment_backend).start()
+
+# Function to keep a scraped dataset in the session so the analysis survives reruns
+def store_dataset(video_id, df):
+    st.session_state['df'] = df
+    st.session_state['video_id'] = video_id
+    st.session_state['dataset_key'] = make_dataset_key(video_id, df, sentiment_backend)
+
+# Function to turn a finished job into the session's dataset and a message shown after the rerun
+def finish_scrape(job):
+    st.session_state['job'] = None
+    if job.status == "failed":
+        st.session_state['scrape_message'] = ("error", f"Error scraping comments: {job.error}. Progress was saved; scrape again to resume.")
+    elif job.status == "cancelled":
+        st.session_state['scrape_message'] = ("warning", f"Scrape cancelled after {job.rows} comments. Progress was saved; scrape again to resume.")
+    elif job.since is not None:
+        st.session_state['scrape_message'] = ("success", f"Scraping complete! Fetched {job.rows} new comments.")
+    else:
+        st.session_state['scrape_message'] = ("success", f"Scraping complete! Total Comments: {job.rows}")
+    if job.status != "failed" and (job.rows or job.since is not None):
+        # Incremental scrapes show the whole stored video; cancelled ones keep what was scraped so far
+        store_dataset(job.video_id, stored_dataset(job.video_id, job.sentiment_backend) if job.since is not None else job.snapshot())
+
+# Function to show quick partial results while a job runs, from the job's running aggregates rather than the full frame
+def render_partial_results(summary):
+    st.write(f"{summary['rows']} comments so far")
+    left, right = st.columns(2)
+    left.bar_chart(summary["sentiment_counts"])
+    right.line_chart(summary["daily_counts"])
+    st.dataframe(summary["recent"])
+
+# Function to poll the background scrape; reruns on its own until the job ends, then reruns the whole app
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_scrape_job():
+    job = st.session_state.get('job')
+    if job is None:
+        return
+    if not job.running:
+        finish_scrape(job)
+        st.rerun()
+    progress = job.progress()
+    if job.resumed_rows:
+        st.info(f"Resumed scrape from checkpoint: {job.resumed_rows} comments already saved.")
+    if progress is None:
+        st.progress(0.0, text=f"Scraping {job.video_id}: {job.rows} comments")
+    else:
+        st.progress(progress, text=f"Scraping {job.video_id}: {job.rows} of about {job.expected} comments")
+    if st.button("Cancel Scrape", key="cancel_scrape_button"):
+        job.cancel()
+    if job.rows:
+        render_partial_results(job.summary())
 
 # Scrape Comments Button
 if st.button("Scrape Comments", key="scrape_comments_button"):  # Unique key
     video_id = extract_video_id(video_url)
     if video_id:
-        with st.spinner("Scraping comments..."):
-            progress_bar = st.progress(0)
-            df, total_comments = scrape_youtube_comments(youtube_api_key, video_id)
-            progress_bar.progress(1)
-            if df is None or total_comments is None:
-                st.error("Error scraping comments. Please try again.")
-            else:
-                st.success(f"Scraping complete! Total Comments: {total_comments}")
-                # Store the original DataFrame
-                st.session_state['df'] = df.copy()  # Store the scraped DataFrame
-                st.write(df)
-                csv = df.to_csv(index=False).encode('utf-8')
-                st.download_button(label="Download CSV", data=csv, file_name="youtube_comments.csv", mime="text/csv")
-
-                # Sentiment Analysis Visualization
-                st.subheader("Sentiment Analysis")
-                sentiment_counts = df['Sentiment'].value_counts()
-                fig, ax = plt.subplots()
-                ax.pie(sentiment_counts, labels=sentiment_counts.index, autopct='%1.1f%%', startangle=140)
-                ax.axis('equal')
-                st.pyplot(fig)
-                export_visualization(fig, "sentiment_analysis.png")
-
-                # Generate Word Cloud
-                st.subheader("Word Cloud")
-                all_comments = ' '.join(df['Comment'])
-                generate_word_cloud(all_comments)
-
-                # Comment Length Analysis
-                st.subheader("Comment Length Analysis")
-                analyze_comment_length(df)
-
-                # Top Commenters
-                st.subheader("Top Commenters")
-                top_commenters_by_comments = st.checkbox("Top Commenters by Number of Comments")
-                top_commenters_by_likes = st.checkbox("Top Commenters by Total Likes")
-                top_n = st.number_input("Number of Top Commenters", min_value=1, value=10, step=1)
-
-                if top_commenters_by_comments:
-                    get_top_commenters(df, by="comments", top_n=top_n)
-
-                if top_commenters_by_likes:
-                    get_top_commenters(df, by="likes", top_n=top_n)
-
-                # Sentiment Analysis Over Time
-                st.subheader("Sentiment Analysis Over Time")
-                analyze_sentiment_over_time(df)
-
-                # Interactive Data Table
-                st.subheader("Interactive Comment Table")
-                display_interactive_table(df)
-
-                # Topic Extraction
-                st.subheader("Topic Extraction")
-                extract_topics(df)
-
-                # User Engagement Score
-                st.subheader("User Engagement Score")
-                df = calculate_engagement(df)
-                st.write(df[["Name", "Comment", "EngagementScore"]].sort_values(by="EngagementScore", ascending=False))
-
-                # Comment Summary
-                st.subheader("Comment Summary")
-                st.write(summarize_comments(model, chat_session, df["Comment"].tolist()))
+        start_scrape(video_id)
+
+# The running scrape job and the result of the last one are shown here
+job_container = st.container()
+
+# Analysis panels are drawn here, once a dataset has been scraped by either button
+analysis_container = st.container()
+
+# Batch Scrape: many videos at once under a shared quota budget, one output partition per video
+with st.expander("Batch Scrape Multiple Videos"):
+    batch_targets = st.text_area("Video URLs, video IDs or channel IDs (one per line)")
+    batch_quota = st.number_input("Quota budget for this batch (units)", min_value=1, value=2000, step=100)
+    if st.button("Scrape All Videos", key="batch_scrape_button"):
+        with st.spinner("Scraping videos..."):
+            client = AsyncYouTube(youtube_api_key, cache=get_response_cache(), scheduler=get_request_scheduler(), api_endpoint=youtube_api_endpoint)
+            video_ids = resolve_targets(client, batch_targets.splitlines())
+            results = BatchScraper(youtube_api_key, quota_budget=batch_quota, scheduler=get_request_scheduler(), api_endpoint=youtube_api_endpoint, cache=get_response_cache()).run(video_ids)
+        st.success(f"Batch finished: {sum(r['status'] == 'done' for r in results)} of {len(results)} videos complete. Output is in batch-output/.")
+        st.write(pd.DataFrame(results))
 
 # Display trending videos
 st.header("Trending Videos")
-trending_videos = get_trending_videos(youtube_api_key)
+# Fetched only on request, so opening the app spends no quota
+trending_videos = get_trending_videos(youtube_api_key) if st.toggle("Show trending videos", key="show_trending") else None
 if trending_videos:
     video_selection = st.selectbox("Select a trending video", [f"{video['title']} (by {video['channelTitle']})" for video in trending_videos])
     selected_video = next(video for video in trending_videos if f"{video['title']} (by {video['channelTitle']})" == video_selection)
@@ -373,76 +512,50 @@ if trending_videos:
     
 
     if st.button("Scrape Comments for Trending Video", key="scrape_trending_comments_button"):  # Unique key
-        video_id = selected_video['videoId']
-        with st.spinner("Scraping comments..."):
-            progress_bar = st.progress(0)
-            df, total_comments = scrape_youtube_comments(youtube_api_key, video_id)
-            progress_bar.progress(1)
-            if df is None or total_comments is None:
-                st.error("Error scraping comments. Please try again.")
-            else:
-                st.success(f"Scraping complete! Total Comments: {total_comments}")
-                st.write(df)
-                csv = df.to_csv(index=False).encode('utf-8')
-                st.download_button(label="Download CSV", data=csv, file_name="youtube_comments.csv", mime="text/csv")
-
-                # Sentiment Analysis Visualization
-                st.subheader("Sentiment Analysis")
-                sentiment_counts = df['Sentiment'].value_counts()
-                fig, ax = plt.subplots()
-                ax.pie(sentiment_counts, labels=sentiment_counts.index, autopct='%1.1f%%', startangle=140)
-                ax.axis('equal')
-                st.pyplot(fig)
-                export_visualization(fig, "sentiment_analysis.png")
-
-                # Generate Word Cloud
-                st.subheader("Word Cloud")
-                all_comments = ' '.join(df['Comment'])
-                generate_word_cloud(all_comments)
-
-                # Comment Length Analysis
-                st.subheader("Comment Length Analysis")
-                analyze_comment_length(df)
-
-                # Top Commenters
-                st.subheader("Top Commenters")
-                top_commenters_by_comments = st.checkbox("Top Commenters by Number of Comments")
-                top_commenters_by_likes = st.checkbox("Top Commenters by Total Likes")
-                top_n = st.number_input("Number of Top Commenters", min_value=1, value=10, step=1)
-
-                if top_commenters_by_comments:
-                    get_top_commenters(df, by="comments", top_n=top_n)
-
-                if top_commenters_by_likes:
-                    get_top_commenters(df, by="likes", top_n=top_n)
-
-                # Sentiment Analysis Over Time
-                st.subheader("Sentiment Analysis Over Time")
-                analyze_sentiment_over_time(df)
-
-                # Interactive Data Table
-                st.subheader("Interactive Comment Table")
-                display_interactive_table(df)
-
-                # Topic Extraction
-                st.subheader("Topic Extraction")
-                extract_topics(df)
-
-                # User Engagement Score
-                st.subheader("User Engagement Score")
-                df = calculate_engagement(df)
-                st.write(df[["Name", "Comment", "EngagementScore"]].sort_values(by="EngagementScore", ascending=False))
-
-                # Comment Summary
-                st.subheader("Comment Summary")
-                st.write(summarize_comments(model, chat_session, df["Comment"].tolist()))
-
-
-# API Quota Monitor
-st.sidebar.subheader("API Quota Monitor")
-
-quota_remaining = api_quota_monitor(gemini_api_key)
-if quota_remaining is not None:
-    st.sidebar.write(f"API Quota Remaining: {quota_remaining}")
-else:
-    st.sidebar.write("Unable to retrieve API quota information.")
\ No newline at end of file
+        start_scrape(selected_video['videoId'])
+
+with job_container:
+    if st.session_state.get('job') is not None:
+        show_scrape_job()
+    elif 'scrape_message' in st.session_state:
+        kind, message = st.session_state['scrape_message']
+        getattr(st, kind)(message)
+
+if not st.session_state['df'].empty:
+    with analysis_container:
+        render_analysis(st.session_state['df'], st.session_state['dataset_key'], st.session_state['video_id'])
+
+
+# Pipeline Metrics: the quota always, and on request where the time went and what was counted
+st.sidebar.subheader("Pipeline Metrics")
+
+quota = get_request_scheduler().metrics()
+st.sidebar.write(f"YouTube API Quota Remaining: {quota['quota_remaining']} / {quota['daily_quota']} units")
+st.sidebar.progress(quota['quota_remaining'] / quota['daily_quota'])
+if quota['quota_exhausted']:
+    st.sidebar.error("Daily quota exhausted; it resets at midnight Pacific Time.")
+
+if st.sidebar.toggle("Show stage timings and counters", key="show_metrics"):
+    snapshot = METRICS.snapshot()
+    st.sidebar.write(f"Requests: {quota['requests']}, Retries: {quota['retries']}, Errors: {quota['errors']}")
+    if snapshot['spans']:
+        spans = pd.DataFrame([{
+            "Stage": " ".join([span['name'], *(f"{label}={value}" for label, value in span['labels'].items())]),
+            "Calls": span['count'],
+            "Total (s)": round(span['seconds'], 2),
+            "Mean (ms)": round(span['seconds'] / span['count'] * 1000, 1),
+            "Max (ms)": round(span['max_seconds'] * 1000, 1),
+        } for span in snapshot['spans']]).sort_values("Total (s)", ascending=False)
+        st.sidebar.dataframe(spans, hide_index=True)
+    totals = {}
+    for counter in snapshot['counters']:
+        totals[counter['name']] = totals.get(counter['name'], 0) + counter['value']
+    st.sidebar.write(f"Pages: {totals.get('pages', 0)}, Rows: {totals.get('rows', 0)}, Quota units: {totals.get('quota_units', 0)}, "
+                     f"Cache hits: {totals.get('cache_hits', 0)} / misses: {totals.get('cache_misses', 0)}")
+
+    cache_stats = get_response_cache().stats()
+    st.sidebar.write(f"API Response Cache: {cache_stats['entries']} entries ({cache_stats['bytes'] / 1e6:.1f} MB)")
+    feature_stats = get_feature_cache().stats()
+    st.sidebar.write(f"Comment Feature Cache: {feature_stats['entries']} entries")
+    st.sidebar.download_button("Download metrics (JSON)", METRICS.to_json(), file_name="metrics.json", mime="application/json")
+    st.sidebar.download_button("Download metrics (Prometheus)", METRICS.to_prometheus(), file_name="metrics.prom", mime="text/plain")
\ No newline at end of file
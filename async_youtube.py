@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# asyncio client for the YouTube Data API endpoints the scrapers read.
+# Requests go over the process-wide pooled session (see pooled_http.py) through
+# the cache and scheduler layers of youtube_http, so page fetches, reply fetches
+# and metadata lookups of one scrape overlap on warm keep-alive connections.
+
+import asyncio
+import functools
+import json
+from collections import deque
+from urllib.parse import urlencode
+
+import pandas as pd
+from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest, HttpRequest
+
+from pooled_http import shared_http
+from youtube_api import youtube_http, needs_reply_completion, comment_rows, comment_records, REPLY_BATCH_SIZE
+
+DEFAULT_API_ENDPOINT = 'https://youtube.googleapis.com/youtube/v3/'
+DEFAULT_BATCH_URI = 'https://youtube.googleapis.com/batch'
+
+
+class AsyncYouTube:
+    """asyncio client for commentThreads, comments, videos, playlistItems and channels.
+
+    Requests pass through youtube_http, so cache hits, rate limiting, retries
+    and quota accounting apply to every call, and with a request_scheduler.QuotaBudget
+    every call is also charged to that budget. The client keeps no event loop
+    state, so one instance can be shared between threads and asyncio.run calls.
+    """
+
+    def __init__(self, api_key, cache=None, scheduler=None, api_endpoint=None, budget=None):
+        self.api_key = api_key
+        self.base_uri = (api_endpoint or DEFAULT_API_ENDPOINT).rstrip('/') + '/'
+        self.batch_uri = api_endpoint.rstrip('/') + '/batch' if api_endpoint else DEFAULT_BATCH_URI
+        self.cache = cache
+        self.scheduler = scheduler
+        self.session = shared_http()
+        self.http = youtube_http(cache, scheduler, budget)
+
+    def uri(self, endpoint, params):
+        params = {key: value for key, value in params.items() if value is not None}
+        params.update(key=self.api_key, alt='json')
+        return f"{self.base_uri}{endpoint}?{urlencode(params)}"
+
+    # Runs a blocking send on the session's worker threads
+    async def send(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.session.executor, functools.partial(function, *args))
+
+    # Sends one GET on a pooled connection and returns the decoded JSON body, raising HttpError like execute() does
+    async def get(self, endpoint, **params):
+        uri = self.uri(endpoint, params)
+        resp, content = await self.send(self.http.request, uri, 'GET')
+        if resp.status >= 400:
+            raise HttpError(resp, content, uri=uri)
+        return json.loads(content)
+
+    # Decodes one inner batch response, caching it under its own GET URI
+    def store(self, uri, resp, content):
+        if self.cache is not None:
+            self.cache.put(uri, dict(resp), content.encode('utf-8') if isinstance(content, str) else content)
+        return json.loads(content)
+
+    # Sends (request_id, endpoint, params) GETs as one batch call and returns their bodies by request_id
+    async def batch(self, requests):
+        """Answers what it can from the response cache and batches the rest.
+
+        The batch POST itself is never cached, so each inner request is looked
+        up by its GET URI first; only the misses are sent (and charged quota),
+        and their responses are cached for the next scrape. Failed inner
+        requests are handed to the scheduler, which backs off and re-sends the
+        retryable ones in a new batch and raises QuotaExhaustedError on quota errors.
+        """
+        responses = {}
+        queue = []
+        for request_id, endpoint, params in requests:
+            uri = self.uri(endpoint, params)
+            cached = self.cache.get(uri) if self.cache is not None else None
+            if cached is not None:
+                responses[request_id] = json.loads(cached[1])
+            else:
+                queue.append((request_id, endpoint, uri))
+
+        attempt = 0
+        while queue:
+            failed = {}
+
+            def collect(request_id, response, exception):
+                if exception is not None:
+                    failed[request_id] = exception
+                else:
+                    responses[request_id] = response
+
+            batch = BatchHttpRequest(callback=collect, batch_uri=self.batch_uri)
+            for request_id, endpoint, uri in queue:
+                batch.add(HttpRequest(self.http, functools.partial(self.store, uri), uri, headers={}), request_id=request_id)
+            await self.send(batch.execute)
+
+            retry = []
+            errors = []
+            delay = 0
+            for request_id, endpoint, uri in queue:
+                error = failed.get(request_id)
+                if error is None:
+                    continue
+                part_delay = None
+                if isinstance(error, HttpError) and self.scheduler is not None:
+                    part_delay = self.scheduler.part_failed(endpoint, error.resp, error.content, attempt)
+                if part_delay is None:
+                    errors.append(error)
+                else:
+                    retry.append((request_id, endpoint, uri))
+                    delay = max(delay, part_delay)
+            if errors:
+                raise errors[0]
+            if retry:
+                await asyncio.sleep(delay)
+            queue = retry
+            attempt += 1
+        return responses
+
+    async def comment_threads(self, **params):
+        return await self.get('commentThreads', **params)
+
+    async def comments(self, **params):
+        return await self.get('comments', **params)
+
+    async def videos(self, **params):
+        return await self.get('videos', **params)
+
+    async def playlist_items(self, **params):
+        return await self.get('playlistItems', **params)
+
+    async def channels(self, **params):
+        return await self.get('channels', **params)
+
+
+# Function to page through every reply of the threads whose inline replies are incomplete
+async def complete_replies(client, threads, text_format=None, batch_size=REPLY_BATCH_SIZE):
+    """Pages comments.list for incomplete threads, grouped into batch calls.
+
+    Every round sends the pending reply pages as batch calls of up to
+    batch_size requests, with all batch calls of the round in flight at once.
+
+    Returns:
+        A dict mapping each completed top-level comment ID to its full list of replies.
+    """
+    replies = {}
+    page_tokens = {}
+    for thread in threads:
+        if needs_reply_completion(thread):
+            parent = thread["snippet"]["topLevelComment"]["id"]
+            replies[parent] = []
+            page_tokens[parent] = None
+
+    while page_tokens:
+        queue = [(parent, "comments", {"part": "snippet", "parentId": parent, "maxResults": 100, "pageToken": page_token, "textFormat": text_format})
+                 for parent, page_token in page_tokens.items()]
+        page_tokens = {}
+        for responses in await asyncio.gather(*(client.batch(queue[start:start + batch_size]) for start in range(0, len(queue), batch_size))):
+            for parent, response in responses.items():
+                replies[parent].extend(response["items"])
+                if "nextPageToken" in response:
+                    page_tokens[parent] = response["nextPageToken"]
+    return replies
+
+
+# Function to fetch one commentThreads page; with since, the page is cut at the first thread not newer than it
+async def fetch_thread_page(client, video_id, page_token=None, since=None, text_format=None):
+    response = await client.comment_threads(part="snippet,replies", videoId=video_id, maxResults=100, pageToken=page_token,
+                                            order="time" if since is not None else None, textFormat=text_format)
+    items = response["items"]
+    next_page_token = response.get("nextPageToken")
+    if since is not None:
+        items = [item for item in items if pd.Timestamp(item["snippet"]["topLevelComment"]["snippet"]["publishedAt"]) > since]
+        if len(items) < len(response["items"]):
+            next_page_token = None
+    return items, next_page_token
+
+
+# Function to fetch one commentThreads page with complete replies
+async def fetch_comment_page(client, video_id, page_token=None, since=None, text_format=None, reply_count=0, store=None):
+    """Fetches one page of a video's comments.
+
+    Args:
+        client: The AsyncYouTube client.
+        video_id: The video to read.
+        page_token: Page to fetch; None for the first page.
+        since: Optional timestamp; threads are then read newest first and the page is
+            cut at the first thread not newer than it, which also ends the paging.
+        text_format: Optional textFormat for the API ("plainText" or "html").
+        reply_count: Value written in the Reply Count column of reply rows.
+        store: Optional CommentStore the page is also upserted into.
+
+    Returns:
+        The rows of the page and the token of the next page (None after the last page).
+    """
+    items, next_page_token = await fetch_thread_page(client, video_id, page_token, since, text_format)
+    completed_replies = await complete_replies(client, items, text_format)
+    if store is not None:
+        store.upsert(comment_records(video_id, items, completed_replies))
+    return comment_rows(items, completed_replies, reply_count), next_page_token
+
+
+# Function to stream a video's comment pages, paging ahead while earlier pages complete their replies
+async def iter_comment_pages(client, video_id, page_token=None, since=None, text_format=None, reply_count=0, store=None, lookahead=1):
+    """Yields (rows, next_page_token) for every page from page_token on, in page order.
+
+    commentThreads pages are fetched one after another as their tokens arrive;
+    the replies of up to lookahead + 1 pages are completed concurrently, so the
+    next page is already in flight while the caller handles the current one.
+    Close the generator (contextlib.aclosing) when stopping early.
+    """
+    pages = deque()
+    more = True
+    try:
+        while more or pages:
+            while more and len(pages) <= lookahead:
+                items, page_token = await fetch_thread_page(client, video_id, page_token, since, text_format)
+                pages.append((items, asyncio.ensure_future(complete_replies(client, items, text_format)), page_token))
+                more = page_token is not None
+            items, replies, next_page_token = pages.popleft()
+            completed_replies = await replies
+            if store is not None:
+                store.upsert(comment_records(video_id, items, completed_replies))
+            yield comment_rows(items, completed_replies, reply_count), next_page_token
+    finally:
+        for _, replies, _ in pages:
+            replies.cancel()
+        await asyncio.gather(*(replies for _, replies, _ in pages), return_exceptions=True)
+
+
+# Function to look up video statistics, 50 IDs per videos.list call (one quota unit each), all calls at once
+async def video_statistics(client, video_ids):
+    responses = await asyncio.gather(*(client.videos(part="statistics", id=",".join(video_ids[start:start + 50]), maxResults=50)
+                                       for start in range(0, len(video_ids), 50)))
+    return {item["id"]: item["statistics"] for response in responses for item in response["items"]}
+
+
+# Function to list the video IDs in a channel's uploads playlist, newest first
+async def channel_video_ids(client, channel_id):
+    response = await client.channels(part="contentDetails", id=channel_id)
+    if not response.get("items"):
+        return []
+    uploads = response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+
+    video_ids = []
+    page_token = None
+    while True:
+        response = await client.playlist_items(part="contentDetails", playlistId=uploads, maxResults=50, pageToken=page_token)
+        video_ids.extend(item["contentDetails"]["videoId"] for item in response["items"])
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return video_ids
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Multi-video batch scraping.
+# Videos are scraped concurrently one page at a time: after each page a video goes
+# to the back of the queue, so a huge video cannot starve the small ones. All
+# pages share one event loop, pooled connections and RequestScheduler, which caps QPS
+# and the quota the batch may spend.
+# Usage: python batch_scraper.py TARGET [TARGET ...] [--file targets.txt] [--workers N] [--quota UNITS]
+
+import argparse
+import asyncio
+import configparser
+import logging
+import os
+import re
+from collections import deque
+
+from async_youtube import AsyncYouTube, fetch_comment_page, channel_video_ids
+from checkpoint import CheckpointStore, DEFAULT_CHECKPOINT_PATH
+from comment_sink import open_sink
+from instrumentation import METRICS, span, increment
+from request_scheduler import RequestScheduler, QuotaBudget, QuotaBudgetExceeded, DEFAULT_DAILY_QUOTA, DEFAULT_QUOTA_PATH
+from response_cache import ResponseCache, DEFAULT_CACHE_PATH
+from youtube_api import extract_video_id, COMMENT_COLUMNS
+
+VIDEO_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{11}$")
+CHANNEL_ID_PATTERN = re.compile(r"^UC[A-Za-z0-9_-]{22}$")
+
+
+# Function to turn video URLs, video IDs and channel IDs into a de-duplicated list of video IDs
+def resolve_targets(client, targets):
+    video_ids = []
+    for target in targets:
+        target = target.strip()
+        if not target or target.startswith('#'):
+            continue
+        channel = re.search(r"(?<=channel/)UC[A-Za-z0-9_-]{22}", target)
+        if CHANNEL_ID_PATTERN.match(target) or channel:
+            video_ids.extend(asyncio.run(channel_video_ids(client, channel.group(0) if channel else target)))
+        elif VIDEO_ID_PATTERN.match(target):
+            video_ids.append(target)
+        elif extract_video_id(target):
+            video_ids.append(extract_video_id(target))
+        else:
+            logging.warning(f"Skipping unrecognised target: {target}")
+    return list(dict.fromkeys(video_ids))
+
+
+class BatchScraper:
+    def __init__(self, api_key, output_dir='batch-output', workers=8, quota_budget=None, scheduler=None,
+                 api_endpoint=None, checkpoint_path=DEFAULT_CHECKPOINT_PATH, max_active=None, cache=None):
+        self.api_key = api_key
+        self.output_dir = output_dir
+        self.workers = workers
+        self.quota_budget = quota_budget
+        self.scheduler = scheduler or RequestScheduler()
+        self.api_endpoint = api_endpoint
+        self.checkpoint_path = checkpoint_path
+        # Videos with an open output file at any one time
+        self.max_active = max_active or workers * 2
+        self.cache = cache
+        # Created per run, so every run gets a fresh quota budget
+        self.budget = None
+        self.client = None
+
+    async def fetch_page(self, video_id, page_token):
+        return await fetch_comment_page(self.client, video_id, page_token, text_format="plainText", reply_count='')
+
+    def output_path(self, video_id):
+        return os.path.join(self.output_dir, f"video_id={video_id}", "comments.csv")
+
+    # Opens a video's output partition and replays any checkpointed pages into it
+    def start_video(self, video_id, checkpoints):
+        path = self.output_path(video_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        job = {'video_id': video_id, 'sink': open_sink(path, COMMENT_COLUMNS), 'page_token': None, 'pages': 0, 'rows': 0, 'status': 'running', 'error': None}
+        state = checkpoints.load(f"batch:{video_id}") if checkpoints else None
+        if state:
+            for rows in checkpoints.iter_pages(f"batch:{video_id}"):
+                job['sink'].write_rows(rows)
+                job['pages'] += 1
+                job['rows'] += len(rows)
+            job['page_token'] = state['next_page_token']
+            if not job['page_token']:
+                job['status'] = 'done'
+        return job
+
+    def finish_video(self, job, checkpoints, status, error=None):
+        job['status'] = status
+        job['error'] = error
+        job['sink'].close()
+        if status == 'done' and checkpoints:
+            checkpoints.finish(f"batch:{job['video_id']}")
+
+    # Page loop of run(): keeps up to `workers` pages in flight, one per video
+    async def scrape(self, video_ids, jobs, checkpoints):
+        waiting = deque(video_ids)
+        ready = deque()
+        in_flight = {}
+
+        try:
+            while waiting or ready or in_flight:
+                while waiting and len(ready) + len(in_flight) < self.max_active:
+                    video_id = waiting.popleft()
+                    job = jobs[video_id] = self.start_video(video_id, checkpoints)
+                    if job['status'] == 'done':
+                        self.finish_video(job, checkpoints, 'done')
+                    else:
+                        ready.append(job)
+
+                while ready and len(in_flight) < self.workers and not self.budget.exhausted:
+                    job = ready.popleft()
+                    in_flight[asyncio.ensure_future(self.fetch_page(job['video_id'], job['page_token']))] = job
+
+                if not in_flight:
+                    # The quota budget is spent: leave the rest checkpointed for the next run
+                    for job in ready:
+                        self.finish_video(job, checkpoints, 'paused')
+                    for video_id in waiting:
+                        jobs[video_id] = {'video_id': video_id, 'pages': 0, 'rows': 0, 'status': 'paused', 'error': None}
+                    break
+
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    job = in_flight.pop(future)
+                    try:
+                        rows, next_page_token = future.result()
+                    except QuotaBudgetExceeded:
+                        # The page is fetched again, from its checkpointed token, on the next run
+                        self.finish_video(job, checkpoints, 'paused')
+                        continue
+                    except Exception as e:
+                        logging.error(f"Error scraping {job['video_id']}: {e}")
+                        self.finish_video(job, checkpoints, 'failed', str(e))
+                        continue
+                    job['sink'].write_rows(rows)
+                    if checkpoints:
+                        checkpoints.save_page(f"batch:{job['video_id']}", job['pages'], rows, next_page_token)
+                    job['pages'] += 1
+                    job['rows'] += len(rows)
+                    increment('pages', scraper='batch')
+                    increment('rows', len(rows), scraper='batch')
+                    job['page_token'] = next_page_token
+                    if next_page_token:
+                        ready.append(job)
+                    else:
+                        self.finish_video(job, checkpoints, 'done')
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def run(self, video_ids):
+        """Scrapes every video into output_dir/video_id=<id>/comments.csv.
+
+        Returns:
+            One summary dict per video with its status ('done', 'failed' or
+            'paused' when the quota budget ran out), pages, rows and error.
+        """
+        # Only this run's requests count against quota_budget, checked before every page and reply batch
+        self.budget = QuotaBudget(self.quota_budget)
+        self.client = AsyncYouTube(self.api_key, cache=self.cache, scheduler=self.scheduler, api_endpoint=self.api_endpoint, budget=self.budget)
+        checkpoints = CheckpointStore(self.checkpoint_path) if self.checkpoint_path else None
+        jobs = {}
+        try:
+            with span('scrape', scraper='batch'):
+                asyncio.run(self.scrape(video_ids, jobs, checkpoints))
+        finally:
+            if checkpoints:
+                checkpoints.close()
+
+        return [{key: jobs[video_id][key] for key in ('video_id', 'status', 'pages', 'rows', 'error')} for video_id in video_ids if video_id in jobs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape the comments of many videos at once")
+    parser.add_argument("targets", nargs="*", help="video URLs, video IDs or channel IDs")
+    parser.add_argument("--file", help="file with one target per line")
+    parser.add_argument("--output", default="batch-output", help="output directory, partitioned per video")
+    parser.add_argument("--workers", type=int, default=8, help="pages fetched concurrently")
+    parser.add_argument("--quota", type=int, default=None, help="quota units this batch may spend")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="API response cache, so reruns within the TTLs spend no quota")
+    parser.add_argument("--metrics", help="write stage timings and counters here (.json, else Prometheus text)")
+    args = parser.parse_args()
+
+    cpass = configparser.RawConfigParser()
+    cpass.read('config.data')
+    api_key = cpass.get('cred', 'id')
+    scheduler = RequestScheduler(qps=cpass.getfloat('cred', 'qps', fallback=10.0), daily_quota=cpass.getint('cred', 'quota', fallback=DEFAULT_DAILY_QUOTA), state_path=DEFAULT_QUOTA_PATH)
+
+    targets = list(args.targets)
+    if args.file:
+        with open(args.file, encoding='utf-8') as f:
+            targets.extend(f.read().splitlines())
+
+    cache = ResponseCache(args.cache)
+    video_ids = resolve_targets(AsyncYouTube(api_key, cache=cache, scheduler=scheduler), targets)
+    print(f"[+] Scraping {len(video_ids)} videos with {args.workers} workers")
+    results = BatchScraper(api_key, output_dir=args.output, workers=args.workers, quota_budget=args.quota, scheduler=scheduler, cache=cache).run(video_ids)
+    for result in results:
+        print(f"    {result['video_id']}: {result['status']}, {result['rows']} rows in {result['pages']} pages" + (f" ({result['error']})" if result['error'] else ""))
+    metrics = scheduler.metrics()
+    print(f"[+] Quota used: {metrics['quota_used']} units, {metrics['quota_remaining']} remaining today")
+    if args.metrics:
+        METRICS.write(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Offline benchmarks for the scrapers and analyzers, run against fake_youtube_api.py.
+# Every stage reports its wall time, throughput, peak memory growth and the API
+# requests it made; --json saves the numbers to compare runs before deploying.
+# Usage: python benchmark.py [scraper|analysis|sentiment|startup|all] [--threads N] [--max-replies N] [--latency SECONDS]
+#        [--error-rate SHARE] [--workers N] [--comments N] [--runs N] [--json PATH]
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+import pandas as pd
+from googleapiclient.errors import HttpError
+
+from fake_youtube_api import FakeVideo, FakeYouTubeServer
+from request_scheduler import RequestScheduler
+from sentiment import analyze_sentiments
+from text_features import FeatureCache
+from youtube_api import youtube_http
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Libraries that should only be imported once the panel using them is shown
+HEAVY_MODULES = ["matplotlib.pyplot", "seaborn", "wordcloud", "plotly.express", "google.generativeai", "gensim", "textblob"]
+
+# Runs app.py twice in a fresh interpreter (cold start, then a rerun) and prints the timings as JSON
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+app.secrets["general"] = {"GEMINI_API_KEY": "benchmark", "YOUTUBE_API_KEY": "benchmark"}
+app.run()
+first = time.perf_counter()
+app.run()
+rerun = time.perf_counter()
+print(json.dumps({
+    "streamlit_import": imported - start,
+    "first_run": first - imported,
+    "rerun": rerun - first,
+    "errors": [str(e.value) for e in app.exception],
+    "heavy_modules": [name for name in json.loads(sys.argv[2]) if name in sys.modules],
+}))
+"""
+
+
+# Stage results of this run, written out by --json
+RESULTS = []
+
+
+# Function to read the resident memory of this process, or None where /proc is not available
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+# Samples the process RSS on a background thread while a stage runs, so stages are
+# timed without tracemalloc's overhead; reports the peak growth over the starting RSS
+class PeakMemory:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start = None
+        self.peak = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        self.start = self.peak = current_rss()
+        if self.start is not None:
+            self.thread = threading.Thread(target=self.sample, daemon=True)
+            self.thread.start()
+        return self
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.peak = max(self.peak, current_rss())
+
+    @property
+    def megabytes(self):
+        return None if self.start is None else (self.peak - self.start) / 2 ** 20
+
+
+# Function to run one stage, returning its result, wall time and peak memory growth in MB
+def measure(function):
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+    return result, elapsed, memory.megabytes
+
+
+# Function to print one stage's line and keep it for --json
+def report(suite, stage, elapsed, items, unit, megabytes, server=None, retries=None):
+    line = f"    {stage:30s} {elapsed:7.2f}s  {items / elapsed if elapsed else 0:9.0f} {unit}/s"
+    line += f"  peak +{megabytes:6.1f} MB" if megabytes is not None else "  peak n/a"
+    if server is not None:
+        line += f"  [{format_requests(server)}]"
+    if retries:
+        line += f"  retries={retries}"
+    print(line)
+    RESULTS.append({
+        "suite": suite, "stage": stage, "seconds": round(elapsed, 4), "items": items, "unit": unit,
+        "throughput": round(items / elapsed, 1) if elapsed else None,
+        "peak_mb": round(megabytes, 1) if megabytes is not None else None,
+        "requests": dict(server.request_counts) if server is not None else None,
+        "errors": dict(server.error_counts) if server is not None else None,
+        "retries": retries,
+    })
+
+
+# Function to import "YT Scraper.py", whose file name is not a valid module name
+def load_cli_scraper():
+    spec = importlib.util.spec_from_file_location("yt_scraper", os.path.join(HERE, "YT Scraper.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# The sequential scrape_all_with_replies that "YT Scraper.py" had before concurrent reply fetching, kept as the baseline:
+# one blocking commentThreads call per page, then one blocking comments.list call per reply page of every thread with replies
+def legacy_scrape_all_with_replies(endpoint, video_id, scheduler):
+    http = youtube_http(scheduler=scheduler)
+
+    def get(resource, **params):
+        uri = f"{endpoint.rstrip('/')}/{resource}?{urlencode({**params, 'key': 'fake-key', 'maxResults': 100, 'textFormat': 'plainText'})}"
+        resp, content = http.request(uri, 'GET')
+        if resp.status >= 400:
+            raise HttpError(resp, content, uri=uri)
+        return json.loads(content)
+
+    rows = []
+    page_token = None
+    while True:
+        data = get("commentThreads", part="snippet", videoId=video_id, **({"pageToken": page_token} if page_token else {}))
+        for item in data["items"]:
+            top = item["snippet"]["topLevelComment"]
+            rows.append([top["snippet"]["authorDisplayName"], top["snippet"]["textDisplay"], top["snippet"]["likeCount"],
+                         top["snippet"]["publishedAt"], item["snippet"]["totalReplyCount"]])
+            reply_token = None
+            while item["snippet"]["totalReplyCount"] > 0:
+                replies = get("comments", part="snippet", parentId=top["id"], **({"pageToken": reply_token} if reply_token else {}))
+                rows.extend([reply["snippet"]["authorDisplayName"], reply["snippet"]["textDisplay"], reply["snippet"]["likeCount"],
+                             reply["snippet"]["publishedAt"], ""] for reply in replies["items"])
+                reply_token = replies.get("nextPageToken")
+                if not reply_token:
+                    break
+        page_token = data.get("nextPageToken")
+        if not page_token:
+            return rows
+
+
+# Function to run the sequential baseline; returns its time, rows, memory and retries
+def bench_sequential(server, video_id):
+    server.reset_counts()
+    scheduler = RequestScheduler(qps=0)
+    rows, elapsed, megabytes = measure(lambda: legacy_scrape_all_with_replies(server.endpoint, video_id, scheduler))
+    return elapsed, len(rows), megabytes, scheduler.metrics()["retries"]
+
+
+# Function to run scrape_all_with_replies with a given page lookahead; returns its time, rows, output, memory and retries
+def bench_replies(scraper, server, video_id, workers):
+    with tempfile.TemporaryDirectory() as tmp:
+        server.reset_counts()
+        scheduler = RequestScheduler(qps=0)
+        output = os.path.join(tmp, "out.csv")
+        _, elapsed, megabytes = measure(lambda: scraper.scrape_all_with_replies("fake-key", video_id, max_workers=workers, api_endpoint=server.endpoint,
+                                                                                output=output, checkpoint_path=None, scheduler=scheduler))
+        with open(output, encoding="utf-8") as f:
+            result = f.read()
+    return elapsed, result.count("\n") - 1, result, megabytes, scheduler.metrics()["retries"]
+
+
+# Function to format the fake server's per-endpoint request counts, with injected errors
+def format_requests(server):
+    counts = ", ".join(f"{path.rsplit('/', 1)[-1]}={count}" for path, count in sorted(server.request_counts.items()))
+    errors = sum(server.error_counts.values())
+    return f"{counts}, 503s={errors}" if errors else counts
+
+
+# Function to import app.py outside `streamlit run`, pointed at the fake server.
+# Streamlit calls run in bare mode; the app's caches are created in the current directory.
+def load_app(server):
+    os.makedirs(".streamlit", exist_ok=True)
+    with open(os.path.join(".streamlit", "secrets.toml"), "w", encoding="utf-8") as f:
+        f.write(f'[general]\nGEMINI_API_KEY = "benchmark"\nYOUTUBE_API_KEY = "benchmark"\nYOUTUBE_API_ENDPOINT = "{server.endpoint}"\nYOUTUBE_QPS = 0\n')
+    import streamlit.logger
+    from streamlit import config
+    # Parse Streamlit's config first, or parsing it later resets the level and bare mode warns on every st call
+    config.get_option("logger.level")
+    streamlit.logger.set_log_level("error")
+    spec = importlib.util.spec_from_file_location("benchmark_app", os.path.join(HERE, "app.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    # app.py logs every page at INFO
+    logging.getLogger().setLevel(logging.WARNING)
+    return module
+
+
+# The per-comment analyze_sentiment that app.py used before the batched engine, kept as the baseline
+def legacy_analyze_sentiment(comment):
+    from textblob import TextBlob
+    analysis = TextBlob(comment)
+    if analysis.sentiment.polarity > 0:
+        return 'Positive'
+    elif analysis.sentiment.polarity == 0:
+        return 'Neutral'
+    else:
+        return 'Negative'
+
+
+# Function to build a comment corpus of the requested size from the sample scrape shipped with the repo
+def sample_comments(count):
+    comments = pd.read_csv(os.path.join(HERE, "YT-Scrape-Result.csv"))["Comment"].dropna().astype(str).tolist()
+    return (comments * (count // len(comments) + 1))[:count]
+
+
+def run_sentiment_benchmark(args):
+    comments = sample_comments(args.comments)
+    print(f"[+] sentiment: {len(comments)} comments")
+    runs = [
+        ("legacy analyze_sentiment", lambda: [legacy_analyze_sentiment(c) for c in comments]),
+        ("textblob, 1 process", lambda: analyze_sentiments(comments, processes=1)),
+        (f"textblob, {os.cpu_count()} processes", lambda: analyze_sentiments(comments)),
+        ("lexicon, 1 process", lambda: analyze_sentiments(comments, backend="lexicon", processes=1)),
+    ]
+    tmp = tempfile.TemporaryDirectory()
+    cache = FeatureCache(os.path.join(tmp.name, "features.db"))
+    analyze_sentiments(comments, processes=1, cache=cache)
+    runs.append(("textblob, warm feature cache", lambda: analyze_sentiments(comments, processes=1, cache=cache)))
+    baseline = None
+    for name, run in runs:
+        labels, elapsed, megabytes = measure(run)
+        baseline = baseline or labels
+        agreement = sum(a == b for a, b in zip(labels, baseline)) / len(baseline)
+        report("sentiment", name, elapsed, len(comments), "comments", megabytes)
+        RESULTS[-1]["agreement"] = round(agreement, 4)
+        print(f"      agreement with legacy: {agreement:.1%}")
+    cache.close()
+    tmp.cleanup()
+
+
+def run_startup_benchmark(args):
+    print(f"[+] app startup: median of {args.runs} fresh interpreters")
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # Run from an empty directory so the app's SQLite caches start cold
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, os.path.join(HERE, "app.py"), json.dumps(HEAVY_MODULES)],
+                                    cwd=tmp, capture_output=True, text=True, check=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+    for name in ("streamlit_import", "first_run", "rerun"):
+        median = statistics.median(r[name] for r in results)
+        print(f"    {name:18s} {median * 1000:8.0f} ms")
+        RESULTS.append({"suite": "startup", "stage": name, "seconds": round(median, 4), "runs": args.runs,
+                        "heavy_modules": results[-1]["heavy_modules"], "errors": results[-1]["errors"]})
+    print(f"    heavy modules loaded at startup: {', '.join(results[-1]['heavy_modules']) or 'none'}")
+    if results[-1]["errors"]:
+        print(f"    errors: {results[-1]['errors']}")
+
+
+def run_scraper_benchmark(args):
+    scraper = load_cli_scraper()
+    video = FakeVideo("benchvideo01", threads=args.threads, max_replies=args.max_replies)
+    with FakeYouTubeServer([video], latency=args.latency, error_rate=args.error_rate) as server:
+        print(f"[+] scrape_all_with_replies: {args.threads} threads, up to {args.max_replies} replies, {args.latency * 1000:.0f} ms latency, {args.error_rate:.1%} errors")
+        sequential, sequential_rows, megabytes, retries = bench_sequential(server, video.video_id)
+        report("scraper", "sequential (before concurrency)", sequential, sequential_rows, "rows", megabytes, server, retries)
+        single, rows, baseline, megabytes, retries = bench_replies(scraper, server, video.video_id, workers=1)
+        report("scraper", "lookahead 1", single, rows, "rows", megabytes, server, retries)
+        concurrent, rows, result, megabytes, retries = bench_replies(scraper, server, video.video_id, workers=args.workers)
+        report("scraper", f"lookahead {args.workers}", concurrent, rows, "rows", megabytes, server, retries)
+        print(f"    speedup over sequential: {sequential / concurrent:.1f}x (lookahead 1: {sequential / single:.1f}x), "
+              f"identical output: {baseline == result}, rows: {sequential_rows}/{rows}, expected rows: {video.comment_count}")
+
+
+def run_analysis_benchmark(args):
+    video = FakeVideo("benchvideo02", threads=args.threads, max_replies=args.max_replies)
+    cwd = os.getcwd()
+    with FakeYouTubeServer([video], latency=args.latency, error_rate=args.error_rate) as server, tempfile.TemporaryDirectory() as tmp:
+        # Run from an empty directory so the app's SQLite caches and saved topic models start cold
+        os.chdir(tmp)
+        try:
+            app = load_app(server)
+            import matplotlib.pyplot as plt
+            print(f"[+] app.py analysis: {args.threads} threads, up to {args.max_replies} replies, {args.latency * 1000:.0f} ms latency, {args.error_rate:.1%} errors")
+
+            def scrape():
+                retries = app.get_request_scheduler().metrics()["retries"]
+                server.reset_counts()
+                (df, rows), elapsed, megabytes = measure(lambda: app.scrape_youtube_comments("benchmark", video.video_id))
+                return df, rows, elapsed, megabytes, app.get_request_scheduler().metrics()["retries"] - retries
+
+            df, rows, elapsed, megabytes, retries = scrape()
+            if df is None:
+                print("    scrape_youtube_comments failed")
+                return
+            report("analysis", "scrape_youtube_comments", elapsed, rows, "rows", megabytes, server, retries)
+            # The second scrape answers pages from the response cache and labels from the feature cache
+            _, rows, elapsed, megabytes, retries = scrape()
+            report("analysis", "scrape_youtube_comments, warm", elapsed, rows, "rows", megabytes, server, retries)
+
+            comments = df["Comment"].tolist()
+            _, elapsed, megabytes = measure(lambda: analyze_sentiments(comments, processes=1))
+            report("analysis", "sentiment, textblob", elapsed, len(comments), "comments", megabytes)
+            _, elapsed, megabytes = measure(lambda: analyze_sentiments(comments, backend="lexicon", processes=1))
+            report("analysis", "sentiment, lexicon", elapsed, len(comments), "comments", megabytes)
+            _, elapsed, megabytes = measure(lambda: app.calculate_engagement(df.copy()))
+            report("analysis", "engagement", elapsed, len(df), "comments", megabytes)
+
+            dataset_key = app.make_dataset_key(video.video_id, df, "textblob")
+            analytics, elapsed, megabytes = measure(lambda: app.compute_analytics(dataset_key, df, video.video_id))
+            report("analysis", "compute_analytics", elapsed, len(df), "comments", megabytes)
+            collapsed = analytics["collapsed"]
+            print(f"    near-duplicate clusters: {len(collapsed)} of {len(df)} comments")
+            _, elapsed, megabytes = measure(lambda: app.generate_word_cloud(frequencies=analytics["word_frequencies"]))
+            plt.close("all")
+            report("analysis", "word cloud", elapsed, len(collapsed), "clusters", megabytes)
+            _, elapsed, megabytes = measure(lambda: app.compute_topics(dataset_key, collapsed, video.video_id))
+            report("analysis", "topics", elapsed, len(collapsed), "clusters", megabytes)
+            # Train a second model on half the clusters, then load it back and update it with the rest,
+            # the path a rescrape takes (LdaMulticore on multi-core hosts)
+            from topics import video_topics
+            half = len(collapsed) // 2
+            video_topics(f"{video.video_id}-update", collapsed["Comment"][:half], weights=collapsed["Count"][:half])
+            lda, elapsed, megabytes = measure(lambda: video_topics(f"{video.video_id}-update", collapsed["Comment"], weights=collapsed["Count"]))
+            report("analysis", f"topics, {type(lda).__name__} update", elapsed, len(collapsed) - half, "clusters", megabytes)
+        finally:
+            os.chdir(cwd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline scraper and analyzer benchmarks")
+    parser.add_argument("suite", nargs="?", default="all", choices=["scraper", "analysis", "sentiment", "startup", "all"])
+    parser.add_argument("--threads", type=int, default=2000, help="top-level comment threads in the fake video")
+    parser.add_argument("--max-replies", type=int, default=20, help="most replies a fake comment thread can have")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake API latency per request in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake API requests failed with a retryable 503")
+    parser.add_argument("--workers", type=int, default=8, help="pages with replies in flight for the concurrent run")
+    parser.add_argument("--comments", type=int, default=20000, help="comments for the sentiment benchmark")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters for the startup benchmark")
+    parser.add_argument("--json", help="also write the stage results to this JSON file")
+    args = parser.parse_args()
+
+    if args.suite in ("scraper", "all"):
+        run_scraper_benchmark(args)
+    if args.suite in ("analysis", "all"):
+        run_analysis_benchmark(args)
+    if args.suite in ("sentiment", "all"):
+        run_sentiment_benchmark(args)
+    if args.suite in ("startup", "all"):
+        run_startup_benchmark(args)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(RESULTS, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Channel-wide crawl that keeps every video of a channel current for little quota.
+# The uploads playlist is walked 50 videos per call, statistics are looked up 50
+# IDs per videos.list call, and only videos whose commentCount changed since the
+# last crawl are queued for comment scraping.
+# Usage: python channel_crawler.py CHANNEL_ID [CHANNEL_ID ...] [--workers N] [--quota UNITS]
+
+import argparse
+import asyncio
+import configparser
+import sqlite3
+import time
+
+from batch_scraper import BatchScraper
+from instrumentation import METRICS
+from request_scheduler import RequestScheduler, DEFAULT_DAILY_QUOTA, DEFAULT_QUOTA_PATH
+from async_youtube import AsyncYouTube, channel_video_ids, video_statistics
+
+DEFAULT_CRAWL_PATH = 'channel-crawl.db'
+
+
+# Comment counts seen at the last successful scrape of each video
+class CrawlState:
+    def __init__(self, path=DEFAULT_CRAWL_PATH):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS videos (
+                video_id TEXT PRIMARY KEY,
+                channel_id TEXT NOT NULL,
+                comment_count INTEGER NOT NULL,
+                scraped_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def comment_counts(self, channel_id):
+        return dict(self.conn.execute("SELECT video_id, comment_count FROM videos WHERE channel_id = ?", (channel_id,)))
+
+    def mark_scraped(self, channel_id, video_id, comment_count):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO videos (video_id, channel_id, comment_count, scraped_at) VALUES (?, ?, ?, ?)",
+                (video_id, channel_id, comment_count, time.time()),
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+# Function to find the videos of a channel whose comment count changed since the last crawl
+async def changed_videos(client, channel_id, state):
+    """Walks a channel's uploads and compares comment counts with the crawl state.
+
+    Returns:
+        A dict of video ID -> current commentCount for videos that are new or
+        changed. Videos with comments disabled (no commentCount) are left out.
+    """
+    video_ids = await channel_video_ids(client, channel_id)
+    known = state.comment_counts(channel_id)
+    changed = {}
+    for video_id, statistics in (await video_statistics(client, video_ids)).items():
+        if "commentCount" not in statistics:
+            continue
+        comment_count = int(statistics["commentCount"])
+        if known.get(video_id) != comment_count:
+            changed[video_id] = comment_count
+    return changed
+
+
+# Function to crawl a channel and scrape only its changed videos
+def crawl_channel(api_key, channel_id, state, scheduler=None, workers=8, quota_budget=None, output_dir='batch-output', api_endpoint=None):
+    scheduler = scheduler or RequestScheduler()
+    # No response cache here: the crawl acts on changed comment counts, and a cached count or
+    # first page would mark a video scraped without its newest comments
+    client = AsyncYouTube(api_key, scheduler=scheduler, api_endpoint=api_endpoint)
+    changed = asyncio.run(changed_videos(client, channel_id, state))
+    scraper = BatchScraper(api_key, output_dir=output_dir, workers=workers, quota_budget=quota_budget, scheduler=scheduler, api_endpoint=api_endpoint)
+    results = scraper.run(list(changed))
+    # Only record a new count once the video was scraped, so failed or paused videos are retried next crawl
+    for result in results:
+        if result['status'] == 'done':
+            state.mark_scraped(channel_id, result['video_id'], changed[result['video_id']])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the comments of whole channels current")
+    parser.add_argument("channels", nargs="+", help="channel IDs (UC...)")
+    parser.add_argument("--output", default="batch-output", help="output directory, partitioned per video")
+    parser.add_argument("--workers", type=int, default=8, help="pages fetched concurrently")
+    parser.add_argument("--quota", type=int, default=None, help="quota units each channel's scrape may spend")
+    parser.add_argument("--state", default=DEFAULT_CRAWL_PATH, help="crawl state database")
+    parser.add_argument("--metrics", help="write stage timings and counters here (.json, else Prometheus text)")
+    args = parser.parse_args()
+
+    cpass = configparser.RawConfigParser()
+    cpass.read('config.data')
+    api_key = cpass.get('cred', 'id')
+    scheduler = RequestScheduler(qps=cpass.getfloat('cred', 'qps', fallback=10.0), daily_quota=cpass.getint('cred', 'quota', fallback=DEFAULT_DAILY_QUOTA), state_path=DEFAULT_QUOTA_PATH)
+
+    state = CrawlState(args.state)
+    try:
+        for channel_id in args.channels:
+            results = crawl_channel(api_key, channel_id, state, scheduler=scheduler, workers=args.workers, quota_budget=args.quota, output_dir=args.output)
+            print(f"[+] {channel_id}: {len(results)} videos changed, {sum(r['status'] == 'done' for r in results)} scraped")
+            for result in results:
+                print(f"    {result['video_id']}: {result['status']}, {result['rows']} rows" + (f" ({result['error']})" if result['error'] else ""))
+    finally:
+        state.close()
+    metrics = scheduler.metrics()
+    print(f"[+] Quota used: {metrics['quota_used']} units, {metrics['quota_remaining']} remaining today")
+    if args.metrics:
+        METRICS.write(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
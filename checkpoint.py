@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# SQLite checkpoint store for long scrapes.
+# Every completed page is saved together with the token of the next page, so an
+# interrupted scrape can replay what it already has and continue from there.
+
+import json
+import sqlite3
+import time
+
+DEFAULT_CHECKPOINT_PATH = 'scrape-checkpoints.db'
+
+
+class CheckpointStore:
+    def __init__(self, path=DEFAULT_CHECKPOINT_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS scrapes (
+                key TEXT PRIMARY KEY,
+                next_page_token TEXT,
+                pages INTEGER NOT NULL,
+                rows INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                rows TEXT NOT NULL,
+                PRIMARY KEY (key, page)
+            );
+        """)
+
+    # Returns {'next_page_token', 'pages', 'rows'} for an unfinished scrape, or None
+    def load(self, key):
+        row = self.conn.execute("SELECT next_page_token, pages, rows FROM scrapes WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return {'next_page_token': row[0], 'pages': row[1], 'rows': row[2]}
+
+    # Yields the saved rows page by page, in scrape order
+    def iter_pages(self, key):
+        for (rows,) in self.conn.execute("SELECT rows FROM pages WHERE key = ? ORDER BY page", (key,)):
+            yield json.loads(rows)
+
+    # Saves one completed page and the token of the page after it in a single transaction
+    def save_page(self, key, page, rows, next_page_token):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO pages (key, page, rows) VALUES (?, ?, ?)", (key, page, json.dumps(rows)))
+            self.conn.execute(
+                "INSERT INTO scrapes (key, next_page_token, pages, rows, updated_at) VALUES (?, ?, 1, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET next_page_token = excluded.next_page_token, pages = pages + 1, "
+                "rows = rows + excluded.rows, updated_at = excluded.updated_at",
+                (key, next_page_token, len(rows), time.time()),
+            )
+
+    # Drops the checkpoint once the scrape has finished
+    def finish(self, key):
+        with self.conn:
+            self.conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+            self.conn.execute("DELETE FROM scrapes WHERE key = ?", (key,))
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
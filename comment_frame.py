@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Compact columnar representation of scraped comments.
+# Each page is typed as soon as it arrives: authors become codes into one shared
+# dictionary, timestamps int64 epoch seconds, counts int32 and texts Arrow strings.
+# The pages are kept as Arrow record batches and handed to pandas in one step.
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from instrumentation import timed
+
+SENTIMENT_CATEGORIES = ['Positive', 'Neutral', 'Negative']
+
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+PAGE_SCHEMA = pa.schema([
+    ('Name', pa.int32()),
+    ('Comment', pa.string()),
+    ('Likes', pa.int32()),
+    ('Time', pa.timestamp('s', tz='UTC')),
+    ('Reply Count', pa.int32()),
+])
+
+
+class CommentFrameBuilder:
+    def __init__(self):
+        self.authors = {}
+        self.batches = []
+        self.num_rows = 0
+
+    # Types one page of scraper rows; the row lists can be dropped as soon as this returns
+    @timed('frame_build')
+    def add_page(self, rows):
+        if not rows:
+            return
+        names, comments, likes, times, reply_counts = zip(*rows)
+        codes = [self.authors.setdefault(name, len(self.authors)) for name in names]
+        self.batches.append(pa.RecordBatch.from_arrays([
+            pa.array(codes, pa.int32()),
+            pa.array(comments, pa.string()),
+            pa.array(likes, pa.int32()),
+            pc.strptime(pa.array(times, pa.string()), format=TIME_FORMAT, unit='s').cast(PAGE_SCHEMA.field('Time').type),
+            pa.array([count or 0 for count in reply_counts], pa.int32()),
+        ], schema=PAGE_SCHEMA))
+        self.num_rows += len(rows)
+
+    def to_arrow(self):
+        table = pa.Table.from_batches(self.batches, schema=PAGE_SCHEMA)
+        # Every page indexes the same author dictionary, so the codes need no remapping
+        dictionary = pa.array(list(self.authors), pa.string())
+        names = pa.chunked_array([pa.DictionaryArray.from_arrays(chunk, dictionary) for chunk in table['Name'].chunks],
+                                 type=pa.dictionary(pa.int32(), pa.string()))
+        return table.set_column(0, 'Name', names)
+
+    @timed('frame_to_pandas')
+    def to_pandas(self):
+        """Returns the comments as a DataFrame in the scraper's column layout.
+
+        Name is categorical, Comment an Arrow-backed string, Likes and Reply Count
+        int32 and Time datetime64[s, UTC] (int64 epoch seconds underneath).
+        """
+        return self.to_arrow().to_pandas(types_mapper={pa.string(): pd.StringDtype('pyarrow')}.get)
+
+
+# Function to store sentiment labels as a three-value categorical instead of repeated strings
+def sentiment_categorical(labels):
+    return pd.Categorical(labels, categories=SENTIMENT_CATEGORIES)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Streaming output sinks for scraped comments.
+# Rows are written page by page so memory stays flat however many comments a video has.
+
+import csv
+
+# Rows buffered before a Parquet row group is flushed
+ROW_GROUP_SIZE = 50000
+
+
+# Writes rows to a CSV file as they arrive
+class CsvSink:
+    def __init__(self, path, columns, header=True):
+        self.path = path
+        self.columns = list(columns)
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.rows_written = 0
+        if header:
+            self.writer.writerow(self.columns)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+        self.rows_written += len(rows)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Writes rows to a Parquet file in chunked row groups (requires pyarrow)
+class ParquetSink:
+    def __init__(self, path, columns, row_group_size=ROW_GROUP_SIZE):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet output requires pyarrow: pip install pyarrow") from e
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.columns = list(columns)
+        self.row_group_size = row_group_size
+        self.buffer = []
+        self.writer = None
+        self.rows_written = 0
+
+    def write_rows(self, rows):
+        self.buffer.extend(rows)
+        self.rows_written += len(rows)
+        if len(self.buffer) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        # Empty strings (reply rows have no reply count) become nulls so numeric columns stay numeric
+        data = {column: [None if row[i] == '' else row[i] for row in self.buffer] for i, column in enumerate(self.columns)}
+        schema = self.writer.schema if self.writer is not None else None
+        table = self.pa.table(data, schema=schema)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Function to pick a sink from the output file extension
+def open_sink(path, columns, **kwargs):
+    if path.lower().endswith('.parquet'):
+        return ParquetSink(path, columns, **kwargs)
+    return CsvSink(path, columns, **kwargs)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Embedded SQLite store for scraped comments.
+# Comments are keyed by their YouTube comment ID, so re-scraping a video updates
+# rows in place instead of duplicating them, and the indexes on video + time, video +
+# likes and author let the analysis panels query one video out of millions of stored rows.
+
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from comment_frame import CommentFrameBuilder
+from instrumentation import timed
+
+DEFAULT_STORE_PATH = 'comments.db'
+
+# Rows typed per step when a video is read back into a DataFrame
+FETCH_SIZE = 10000
+
+RECORD_COLUMNS = ["comment_id", "parent_id", "video_id", "author", "text", "likes", "reply_count", "published_at"]
+
+# Comment table columns that can be sorted on, and the store column each one sorts by
+SORT_COLUMNS = {"Time": "published_at", "Likes": "likes", "Reply Count": "reply_count", "Name": "author"}
+
+
+class CommentStore:
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        # Shared by scraper threads and Streamlit's per-rerun threads, guarded by self.lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS comments (
+                comment_id TEXT PRIMARY KEY,
+                parent_id TEXT,
+                video_id TEXT NOT NULL,
+                author TEXT NOT NULL,
+                text TEXT NOT NULL,
+                likes INTEGER NOT NULL,
+                reply_count INTEGER NOT NULL,
+                published_at TEXT NOT NULL,
+                scraped_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS comments_video_time ON comments (video_id, published_at);
+            CREATE INDEX IF NOT EXISTS comments_author ON comments (author, video_id);
+            CREATE INDEX IF NOT EXISTS comments_video_likes ON comments (video_id, likes);
+            CREATE TABLE IF NOT EXISTS scraped_until (
+                video_id TEXT PRIMARY KEY,
+                published_at TEXT NOT NULL
+            );
+        """)
+
+    # Inserts new comments and refreshes the text and counts of ones already stored
+    @timed('store_upsert')
+    def upsert(self, records):
+        """Upserts comment records, de-duplicated by comment ID.
+
+        Args:
+            records: Tuples in RECORD_COLUMNS order, as built by youtube_api.comment_records.
+                published_at is the API's ISO 8601 UTC timestamp.
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany("""
+                INSERT INTO comments (comment_id, parent_id, video_id, author, text, likes, reply_count, published_at, scraped_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (comment_id) DO UPDATE SET
+                    author = excluded.author,
+                    text = excluded.text,
+                    likes = excluded.likes,
+                    reply_count = excluded.reply_count,
+                    scraped_at = excluded.scraped_at
+            """, [(*record, now) for record in records])
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    def count(self, video_id):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM comments WHERE video_id = ?", (video_id,)).fetchone()[0]
+
+    # Returns the publish time up to which a video's comment threads are known to be complete, or None.
+    # Pages are stored as they arrive, so the newest stored comment can belong to a scrape that never finished.
+    def scraped_until(self, video_id):
+        with self.lock:
+            row = self.conn.execute("SELECT published_at FROM scraped_until WHERE video_id = ?", (video_id,)).fetchone()
+        return pd.Timestamp(row[0]) if row else None
+
+    # Records a finished scrape: every thread up to the newest stored one has been fetched.
+    # Replies are left out, since incremental scrapes page threads by their own publish time.
+    def mark_scraped(self, video_id):
+        with self.lock, self.conn:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO scraped_until (video_id, published_at)
+                SELECT video_id, MAX(published_at) FROM comments WHERE video_id = ? AND parent_id IS NULL GROUP BY video_id
+            """, (video_id,))
+
+    def video_comments(self, video_id):
+        """Returns a video's comments newest first as a compact comment_frame DataFrame."""
+        builder = CommentFrameBuilder()
+        with self.lock:
+            cursor = self.conn.execute("""
+                SELECT author, text, likes, published_at, reply_count
+                FROM comments WHERE video_id = ?
+                ORDER BY published_at DESC
+            """, (video_id,))
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                builder.add_page(rows)
+        return builder.to_pandas()
+
+    def comment_page(self, video_id, search=None, sort="Time", descending=True, limit=50, offset=0):
+        """Returns one page of a video's comments, filtered and sorted by SQLite.
+
+        Only the requested page is typed into a DataFrame, so a table over
+        millions of stored comments costs one indexed query per page.
+
+        Args:
+            video_id: The video whose comments are listed.
+            search: Optional text that the comment or its author must contain (case-insensitive).
+            sort: A SORT_COLUMNS key.
+            descending: Sort from the largest (newest) value down.
+            limit: Comments per page.
+            offset: Comments skipped before the page.
+
+        Returns:
+            The page as a compact comment_frame DataFrame, and the number of matching comments.
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort column: {sort}")
+        where = "video_id = ?"
+        params = [video_id]
+        if search:
+            pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            where += " AND (text LIKE ? ESCAPE '\\' OR author LIKE ? ESCAPE '\\')"
+            params += [pattern, pattern]
+        # comment_id breaks ties, so rows never move between pages
+        direction = "DESC" if descending else "ASC"
+        builder = CommentFrameBuilder()
+        with self.lock:
+            total = self.conn.execute(f"SELECT COUNT(*) FROM comments WHERE {where}", params).fetchone()[0]
+            builder.add_page(self.conn.execute(f"""
+                SELECT author, text, likes, published_at, reply_count
+                FROM comments WHERE {where}
+                ORDER BY {SORT_COLUMNS[sort]} {direction}, comment_id {direction} LIMIT ? OFFSET ?
+            """, params + [limit, offset]).fetchall())
+        return builder.to_pandas(), total
+
+    # Yields a video's comments newest first, chunk_size rows per DataFrame
+    def iter_video_comments(self, video_id, chunk_size=FETCH_SIZE):
+        # A connection of its own, so a long export neither holds self.lock nor blocks the scrapers writing meanwhile
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute("""
+                SELECT author, text, likes, published_at, reply_count
+                FROM comments WHERE video_id = ?
+                ORDER BY published_at DESC
+            """, (video_id,))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                builder = CommentFrameBuilder()
+                builder.add_page(rows)
+                yield builder.to_pandas()
+        finally:
+            conn.close()
+
+    def top_commenters(self, video_id, by="comments", limit=10):
+        if by not in ("comments", "likes"):
+            raise ValueError(f"Unknown ranking: {by}")
+        return self.query(f"""
+            SELECT author AS "Name", COUNT(*) AS comments, SUM(likes) AS likes
+            FROM comments WHERE video_id = ?
+            GROUP BY author ORDER BY {by} DESC, author LIMIT ?
+        """, (video_id, limit)).set_index("Name")
+
+    # Number of comments per day (or per hour with freq="hour")
+    def comments_over_time(self, video_id, freq="day"):
+        width = {"day": 10, "hour": 13}[freq]
+        df = self.query("""
+            SELECT substr(published_at, 1, ?) AS period, COUNT(*) AS comments
+            FROM comments WHERE video_id = ?
+            GROUP BY period ORDER BY period
+        """, (width, video_id))
+        df['period'] = pd.to_datetime(df['period'] if freq == "day" else df['period'] + ":00", utc=True)
+        return df.set_index('period')['comments']
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Near-duplicate and spam collapsing for scraped comments.
+# Every comment gets a 64-bit SimHash of its word tokens. Fingerprints are split
+# into bands, and a comment only compares itself with the cluster representatives
+# sharing one of its bands, so clustering stays roughly linear in the comment count.
+
+import numpy as np
+
+from instrumentation import timed
+from text_features import cached_map, tokenize_comments, comment_hash
+
+SIMHASH_FEATURE = 'simhash:v1'
+# Fingerprints differing in at most this many bits are near-duplicates
+MAX_DISTANCE = 3
+# With MAX_DISTANCE + 1 bands, two fingerprints within MAX_DISTANCE bits always share a whole band
+BANDS = MAX_DISTANCE + 1
+BAND_BITS = 64 // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+# Comments fingerprinted per numpy step, bounding the per-token bit matrix
+FINGERPRINT_CHUNK = 20000
+
+
+# Function to compute the SimHash of token lists in one vectorized pass
+def simhash_tokens(documents):
+    lengths = np.array([len(tokens) for tokens in documents])
+    token_hashes = b"".join(bytes.fromhex(comment_hash(token)[:16]) for tokens in documents for token in tokens)
+    # One row of 64 bits per token, as +1/-1 votes summed per document
+    bits = np.unpackbits(np.frombuffer(token_hashes, dtype=np.uint8).reshape(-1, 8), axis=1).astype(np.int32) * 2 - 1
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    votes = np.add.reduceat(bits, offsets, axis=0)
+    fingerprints = np.packbits(votes > 0, axis=1)
+    return [int.from_bytes(row.tobytes(), 'big') for row in fingerprints]
+
+
+# Function to fingerprint comments; empty or symbol-only comments hash their raw text instead
+def simhash_fingerprints(texts, cache=None):
+    texts = [text if isinstance(text, str) else "" for text in texts]
+
+    def compute(batch):
+        documents = [tokens or [text] for tokens, text in zip(tokenize_comments(batch, cache=cache), batch)]
+        fingerprints = []
+        for start in range(0, len(documents), FINGERPRINT_CHUNK):
+            fingerprints.extend(simhash_tokens(documents[start:start + FINGERPRINT_CHUNK]))
+        return fingerprints
+
+    return cached_map(texts, SIMHASH_FEATURE, compute, cache)
+
+
+# Function to group comments whose fingerprints are within max_distance bits of a cluster representative
+def cluster_fingerprints(fingerprints):
+    """Assigns every fingerprint to a cluster, leader style.
+
+    Returns:
+        A list with, for each input, the index of its cluster's representative
+        (the first comment of the cluster in input order).
+    """
+    leaders = {}
+    buckets = [{} for _ in range(BANDS)]
+    labels = []
+    for index, fingerprint in enumerate(fingerprints):
+        label = leaders.get(fingerprint)
+        if label is None:
+            bands = [(fingerprint >> (band * BAND_BITS)) & BAND_MASK for band in range(BANDS)]
+            for band, key in enumerate(bands):
+                for candidate, candidate_label in buckets[band].get(key, ()):
+                    if bin(candidate ^ fingerprint).count('1') <= MAX_DISTANCE:
+                        label = candidate_label
+                        break
+                if label is not None:
+                    break
+            if label is None:
+                # A new representative; only representatives are indexed, keeping the buckets small
+                label = index
+                for band, key in enumerate(bands):
+                    buckets[band].setdefault(key, []).append((fingerprint, label))
+            leaders[fingerprint] = label
+        labels.append(label)
+    return labels
+
+
+# Function to collapse near-duplicate comments into one representative per cluster
+@timed('dedup')
+def collapse_duplicates(df, column='Comment', cache=None):
+    """Keeps the first comment of every near-duplicate cluster.
+
+    Returns:
+        The representative rows, in input order, with a Count column holding
+        the size of their cluster.
+    """
+    labels = cluster_fingerprints(simhash_fingerprints(df[column], cache=cache))
+    counts = np.bincount(labels, minlength=len(labels))
+    representatives = np.flatnonzero(counts)
+    reduced = df.iloc[representatives].copy()
+    reduced['Count'] = counts[representatives].astype(np.int32)
+    return reduced
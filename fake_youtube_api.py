@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Local fake of the YouTube Data API used for offline benchmarks.
+# It serves synthetic commentThreads and comments pages, plain or through the
+# batch endpoint, video metadata and a trending chart, plus one channel whose
+# uploads playlist holds every video, so the scrapers and analyzers can be
+# measured without spending real quota. A share of requests, including the ones
+# inside batch calls, can be failed with retryable 503s to exercise the
+# scheduler's backoff.
+
+import json
+import random
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+NOT_FOUND = {"error": {"code": 404, "message": "Not found", "errors": [{"reason": "notFound"}]}}
+BACKEND_ERROR = {"error": {"code": 503, "message": "Backend error", "errors": [{"reason": "backendError"}]}}
+
+TOPIC_WORDS = [
+    ["guitar", "chords", "riff", "solo", "tuning", "strings", "amp"],
+    ["camera", "lens", "lighting", "editing", "footage", "color", "grading"],
+    ["recipe", "garlic", "oven", "sauce", "butter", "dough", "spicy"],
+    ["physics", "energy", "quantum", "gravity", "particles", "theory", "math"],
+    ["gaming", "boss", "level", "speedrun", "controller", "glitch", "ranked"],
+]
+TONE_WORDS = [
+    ["great", "love", "amazing", "awesome", "helpful", "best", "thanks", "this", "video"],
+    ["bad", "boring", "terrible", "worst", "annoying", "wrong", "hate", "this", "video"],
+    ["the", "part", "at", "minute", "where", "you", "explain", "watched", "today"],
+]
+SPAM_TEXT = "Check out my channel for daily giveaways!!"
+# Every this many comments is the same spam text, for the near-duplicate collapsing
+SPAM_EVERY = 25
+
+
+# Function to build a seeded pool of short phrases, each drawn from one word list
+def make_phrases(count, word_lists, seed):
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(rng.choice(word_lists), k=rng.randint(3, 8))) for _ in range(count)]
+
+
+# Comment texts stitch a topic phrase to a tone phrase: cheap to serve, yet about a million distinct texts
+TOPIC_PHRASES = make_phrases(1009, TOPIC_WORDS, 1)
+TONE_PHRASES = make_phrases(1013, TONE_WORDS, 2)
+
+
+# Function to build the text of the index-th synthetic comment
+def comment_text(index):
+    if index % SPAM_EVERY == 0:
+        return SPAM_TEXT
+    return f"{TOPIC_PHRASES[index % 1009].capitalize()}, {TONE_PHRASES[(index // 1009 + index * 7) % 1013]}."
+
+
+# Function to build a synthetic comment resource
+def make_comment(comment_id, video_id, index, parent_id=None):
+    snippet = {
+        "videoId": video_id,
+        "authorDisplayName": f"@user{index % 997}",
+        "textDisplay": comment_text(index),
+        "likeCount": index % 50,
+        "publishedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(1700000000 - index * 60)),
+    }
+    if parent_id:
+        snippet["parentId"] = parent_id
+    return {"kind": "youtube#comment", "id": comment_id, "snippet": snippet}
+
+
+# Synthetic video with a fixed number of threads and a seeded reply distribution
+class FakeVideo:
+    def __init__(self, video_id, threads=1000, max_replies=20, seed=0, title=None):
+        rng = random.Random(seed)
+        self.video_id = video_id
+        self.title = title or f"Synthetic video {video_id}"
+        self.threads = []
+        for t in range(threads):
+            thread_id = f"{video_id}.t{t}"
+            reply_count = rng.choice([0, 0, 0, rng.randint(1, max_replies)]) if max_replies else 0
+            self.threads.append((thread_id, reply_count))
+        self.index = {thread_id: (t, reply_count) for t, (thread_id, reply_count) in enumerate(self.threads)}
+
+    @property
+    def comment_count(self):
+        return len(self.threads) + sum(reply_count for _, reply_count in self.threads)
+
+    def thread(self, position):
+        thread_id, reply_count = self.threads[position]
+        top = make_comment(thread_id, self.video_id, position)
+        item = {
+            "kind": "youtube#commentThread",
+            "id": thread_id,
+            "snippet": {"videoId": self.video_id, "topLevelComment": top, "totalReplyCount": reply_count},
+        }
+        return item
+
+    def replies(self, thread_id):
+        position, reply_count = self.index[thread_id]
+        return [make_comment(f"{thread_id}.r{r}", self.video_id, position * 1000 + r, thread_id) for r in range(reply_count)]
+
+
+# Request handler serving the subset of the API that the scrapers use
+class FakeYouTubeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; with Nagle on, every keep-alive response waits out the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        status, body = self.route(self.path, count=True, fail=True)
+        self.send_json(status, body)
+
+    # Fails a request on purpose with probability error_rate, drawn from the server's seeded RNG
+    def inject_error(self, path):
+        if not self.server.error_rate:
+            return False
+        with self.server.lock:
+            if self.server.rng.random() >= self.server.error_rate:
+                return False
+            self.server.error_counts[path] = self.server.error_counts.get(path, 0) + 1
+        return True
+
+    # Batch requests arrive as multipart/mixed bodies of embedded HTTP requests
+    def do_POST(self):
+        payload = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not urlparse(self.path).path.endswith("/batch"):
+            self.send_json(404, NOT_FOUND)
+            return
+        self.count("/batch")
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.inject_error("/batch"):
+            self.send_json(503, BACKEND_ERROR)
+            return
+
+        header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8")
+        message = BytesParser().parsebytes(header + payload)
+        boundary = uuid.uuid4().hex
+        parts = []
+        for part in message.get_payload():
+            content_id = part["Content-ID"].strip("<>")
+            request_line = part.get_payload().splitlines()[0]
+            status, body = self.route(request_line.split(" ")[1], count=True, sleep=False, fail=True)
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(body)}\r\n"
+            )
+        data = ("".join(parts) + f"--{boundary}--\r\n").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/mixed; boundary={boundary}")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def count(self, path):
+        with self.server.lock:
+            self.server.request_counts[path] = self.server.request_counts.get(path, 0) + 1
+
+    def route(self, target, count=False, sleep=True, fail=False):
+        url = urlparse(target)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if count:
+            self.count(url.path)
+        if sleep and self.server.latency:
+            time.sleep(self.server.latency)
+        if fail and self.inject_error(url.path):
+            return 503, BACKEND_ERROR
+
+        if url.path.endswith("/commentThreads"):
+            body = self.comment_threads(params)
+        elif url.path.endswith("/comments"):
+            body = self.comments(params)
+        elif url.path.endswith("/channels"):
+            body = self.channels(params)
+        elif url.path.endswith("/playlistItems"):
+            body = self.playlist_items(params)
+        elif url.path.endswith("/videos"):
+            body = self.video_list(params)
+        else:
+            body = None
+        return (404, NOT_FOUND) if body is None else (200, body)
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def page(self, items, params, default_size=20):
+        start = int(params.get("pageToken") or 0)
+        size = min(int(params.get("maxResults", default_size)), 100)
+        body = {"items": items[start:start + size], "pageInfo": {"totalResults": len(items), "resultsPerPage": size}}
+        if start + size < len(items):
+            body["nextPageToken"] = str(start + size)
+        return body
+
+    def comment_threads(self, params):
+        video = self.server.videos.get(params.get("videoId"))
+        if video is None:
+            return None
+        start = int(params.get("pageToken") or 0)
+        size = min(int(params.get("maxResults", 20)), 100)
+        items = []
+        for position in range(start, min(start + size, len(video.threads))):
+            item = video.thread(position)
+            if "replies" in params.get("part", ""):
+                inline = video.replies(item["id"])[:5]
+                if inline:
+                    item["replies"] = {"comments": inline}
+            items.append(item)
+        body = {"items": items, "pageInfo": {"totalResults": len(video.threads), "resultsPerPage": size}}
+        if start + size < len(video.threads):
+            body["nextPageToken"] = str(start + size)
+        return body
+
+    def comments(self, params):
+        parent_id = params.get("parentId")
+        video_id = parent_id.split(".t")[0] if parent_id else None
+        video = self.server.videos.get(video_id)
+        if video is None or parent_id not in video.index:
+            return None
+        return self.page(video.replies(parent_id), params)
+
+    def channels(self, params):
+        if params.get("id") != self.server.channel_id:
+            return {"items": []}
+        uploads = "UU" + self.server.channel_id[2:]
+        return {"items": [{"id": self.server.channel_id, "contentDetails": {"relatedPlaylists": {"uploads": uploads}}}]}
+
+    def playlist_items(self, params):
+        if params.get("playlistId") != "UU" + self.server.channel_id[2:]:
+            return None
+        items = [{"contentDetails": {"videoId": video_id}} for video_id in self.server.videos]
+        return self.page(items, params, default_size=5)
+
+    def video_list(self, params):
+        if params.get("chart") == "mostPopular":
+            videos = list(self.server.videos.values())[:int(params.get("maxResults", 5))]
+        else:
+            videos = [self.server.videos[video_id] for video_id in params.get("id", "").split(",")[:50] if video_id in self.server.videos]
+        items = []
+        for video in videos:
+            item = {"id": video.video_id}
+            if "snippet" in params.get("part", ""):
+                item["snippet"] = {"title": video.title, "channelTitle": "Synthetic channel", "channelId": self.server.channel_id}
+            if "statistics" in params.get("part", ""):
+                item["statistics"] = {"viewCount": str(video.comment_count * 100), "likeCount": str(video.comment_count * 5), "commentCount": str(video.comment_count)}
+            items.append(item)
+        return {"items": items}
+
+
+# Threaded HTTP server holding the synthetic videos and request counters
+class FakeYouTubeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, videos, latency=0.0, error_rate=0.0, host="127.0.0.1", port=0, channel_id="UCfakechannel00000000000", seed=0):
+        super().__init__((host, port), FakeYouTubeHandler)
+        self.videos = {video.video_id: video for video in videos}
+        self.channel_id = channel_id
+        self.latency = latency
+        # Share of top-level requests answered with a retryable 503 backendError
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_counts = {}
+        self.error_counts = {}
+        self.thread = None
+
+    def reset_counts(self):
+        with self.lock:
+            self.request_counts.clear()
+            self.error_counts.clear()
+
+    @property
+    def endpoint(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    server = FakeYouTubeServer([FakeVideo("fakevideo01")], latency=0.05, port=8765)
+    print(f"[+] Fake YouTube API listening on {server.endpoint} (video id: fakevideo01)")
+    server.serve_forever()
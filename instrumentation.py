@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Process-wide timing spans and counters for the scrape and analysis pipeline.
+# Stages and API requests are wrapped in span(), events are counted with
+# increment(), and the totals can be exported as JSON or Prometheus text, so a
+# slow scrape shows whether the time went to the API, sentiment, LDA or Gemini.
+
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+METRIC_PREFIX = 'youtube_scraper'
+
+COUNTER_HELP = {
+    'pages': "Comment pages scraped",
+    'rows': "Comment rows scraped",
+    'api_responses': "HTTP responses from the YouTube Data API",
+    'retries': "API requests retried by the scheduler",
+    'quota_units': "YouTube Data API quota units spent",
+    'cache_hits': "Cache lookups answered from a cache",
+    'cache_misses': "Cache lookups that had to be computed or fetched",
+}
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (name, labels) -> [count, total seconds, max seconds]
+        self.spans = {}
+        # (name, labels) -> value
+        self.counters = {}
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+    def observe(self, name, seconds, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            span = self.spans.setdefault(key, [0, 0.0, 0.0])
+            span[0] += 1
+            span[1] += seconds
+            span[2] = max(span[2], seconds)
+
+    # Times the block it wraps, also when it raises
+    @contextmanager
+    def span(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def increment(self, name, value=1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def reset(self):
+        with self.lock:
+            self.spans.clear()
+            self.counters.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'spans': [{'name': name, 'labels': dict(labels), 'count': count, 'seconds': round(total, 6), 'max_seconds': round(longest, 6)}
+                          for (name, labels), (count, total, longest) in sorted(self.spans.items())],
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in sorted(self.counters.items())],
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix=METRIC_PREFIX):
+        """Renders the spans and counters in the Prometheus text exposition format.
+
+        Spans become a {prefix}_span_seconds summary (sum and count) plus a
+        {prefix}_span_max_seconds gauge, labelled with the span name; every
+        counter becomes {prefix}_{name}_total.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        if snapshot['spans']:
+            lines.append(f"# HELP {prefix}_span_seconds Time spent in pipeline stages and API requests")
+            lines.append(f"# TYPE {prefix}_span_seconds summary")
+            for span in snapshot['spans']:
+                labels = prometheus_labels(dict(span['labels'], span=span['name']))
+                lines.append(f"{prefix}_span_seconds_sum{labels} {span['seconds']}")
+                lines.append(f"{prefix}_span_seconds_count{labels} {span['count']}")
+            lines.append(f"# HELP {prefix}_span_max_seconds Longest single span")
+            lines.append(f"# TYPE {prefix}_span_max_seconds gauge")
+            for span in snapshot['spans']:
+                lines.append(f"{prefix}_span_max_seconds{prometheus_labels(dict(span['labels'], span=span['name']))} {span['max_seconds']}")
+        names = list(dict.fromkeys(counter['name'] for counter in snapshot['counters']))
+        for name in names:
+            lines.append(f"# HELP {prefix}_{name}_total {COUNTER_HELP.get(name, name.replace('_', ' ').capitalize())}")
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for counter in snapshot['counters']:
+                if counter['name'] == name:
+                    lines.append(f"{prefix}_{name}_total{prometheus_labels(counter['labels'])} {counter['value']}")
+        return "\n".join(lines) + "\n"
+
+    # Function to save the metrics as JSON (.json) or Prometheus text (anything else)
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_json() if path.endswith('.json') else self.to_prometheus())
+
+
+# Function to format a label set as {name="value",...}, escaped as the exposition format requires
+def prometheus_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in sorted(labels.items()):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+# The registry every module records into
+METRICS = Metrics()
+
+
+def span(name, **labels):
+    return METRICS.span(name, **labels)
+
+
+def increment(name, value=1, **labels):
+    METRICS.increment(name, value, **labels)
+
+
+# Function to decorate a function so every call is recorded as a span
+def timed(name, **labels):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with METRICS.span(name, **labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Chunked process-pool map shared by the CPU-heavy comment stages.
+# Large inputs are split into chunks and spread over a process pool; small ones
+# run in the calling process, where starting a pool would cost more than it saves.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Function to apply function to aligned chunks of the given lists, in parallel for large inputs
+def map_chunks(function, columns, constants=(), processes=None, chunk_size=2000, threshold=5000):
+    """Calls function(*column_chunks, *constants) for every chunk and returns the results in order.
+
+    Args:
+        function: A picklable top-level function.
+        columns: Equal-length lists, chunked together.
+        constants: Extra arguments passed unchanged to every call.
+        processes: Worker processes; defaults to the CPU count, 1 disables the pool.
+        chunk_size: Items per task sent to a worker.
+        threshold: Inputs shorter than this run as one chunk in this process.
+
+    Returns:
+        A list with one result per chunk.
+    """
+    size = len(columns[0])
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or size < threshold:
+        return [function(*columns, *constants)]
+
+    starts = range(0, size, chunk_size)
+    chunks = [[column[start:start + chunk_size] for start in starts] for column in columns]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(function, *chunks, *([constant] * len(starts) for constant in constants)))
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Process-wide pooled HTTP session for the YouTube Data API.
+# PooledHttp is an httplib2.Http drop-in backed by a thread-safe urllib3 pool of
+# keep-alive connections, so every client in the process (discovery clients,
+# AsyncYouTube, scraper threads) sends its requests over the same warm connections.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import httplib2
+import urllib3
+
+from instrumentation import span, increment
+
+# Keep-alive connections per host, and worker threads sending AsyncYouTube requests over them
+POOL_SIZE = 16
+REQUEST_TIMEOUT = 60.0
+
+_shared_http = None
+_shared_lock = threading.Lock()
+
+
+class PooledHttp:
+    def __init__(self, maxsize=POOL_SIZE, timeout=REQUEST_TIMEOUT):
+        # Retries are left to RequestScheduler, which knows the quota rules
+        self.pool = urllib3.PoolManager(maxsize=maxsize, block=True, retries=False, timeout=timeout)
+        self.executor = ThreadPoolExecutor(max_workers=maxsize, thread_name_prefix='youtube-http')
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        endpoint = urlparse(uri).path.rstrip('/').rsplit('/', 1)[-1]
+        try:
+            with span('api_request', endpoint=endpoint):
+                response = self.pool.request(method, uri, body=body, headers=headers, redirect=False)
+        except urllib3.exceptions.HTTPError as e:
+            # Surfaced as a connection error, which RequestScheduler retries
+            raise ConnectionError(str(e)) from e
+        increment('api_responses', endpoint=endpoint, status=response.status)
+        info = {key.lower(): value for key, value in response.headers.items()}
+        info['status'] = str(response.status)
+        return httplib2.Response(info), response.data
+
+    # The pool is shared by every client in the process, so closing one client leaves it open
+    def close(self):
+        pass
+
+
+# Function to get the process-wide PooledHttp, created on first use
+def shared_http():
+    global _shared_http
+    with _shared_lock:
+        if _shared_http is None:
+            _shared_http = PooledHttp()
+        return _shared_http
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Quota-aware request scheduler for the YouTube Data API.
+# ScheduledHttp sits under build() and routes every HTTP call through a shared
+# RequestScheduler, which paces requests with a token bucket, retries transient
+# errors with jittered exponential backoff and counts the quota units spent. With a
+# state_path the units are also persisted per quota day, so restarts and other
+# processes sharing the file see what was already spent today.
+
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+from zoneinfo import ZoneInfo
+
+import httplib2
+from googleapiclient.http import build_http
+
+from instrumentation import span, increment
+
+DEFAULT_DAILY_QUOTA = 10000
+DEFAULT_QUOTA_PATH = 'quota-usage.db'
+
+# Quota units per request; every read endpoint the scrapers use costs 1, search costs 100
+QUOTA_COSTS = {
+    'commentThreads': 1,
+    'comments': 1,
+    'videos': 1,
+    'playlistItems': 1,
+    'channels': 1,
+    'search': 100,
+}
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RETRYABLE_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'backendError'}
+
+# The daily quota resets at midnight Pacific Time
+QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+
+
+class QuotaExhaustedError(Exception):
+    pass
+
+
+class QuotaBudgetExceeded(Exception):
+    pass
+
+
+class QuotaBudget:
+    """Caps the units one job may spend through a shared RequestScheduler.
+
+    Units are reserved before every request is sent, so requests already in
+    flight cannot overshoot the cap, and only this job's requests count
+    against it, whatever else shares the scheduler.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.used = 0
+        # Set once a request was refused, so no new work is started
+        self.exhausted = limit is not None and limit <= 0
+        self.lock = threading.Lock()
+
+    def reserve(self, units):
+        with self.lock:
+            if self.limit is not None and self.used + units > self.limit:
+                self.exhausted = True
+                raise QuotaBudgetExceeded(f"Quota budget spent ({self.used}/{self.limit} units used)")
+            self.used += units
+
+    # Gives back the units of a request that never reached the API
+    def refund(self, units):
+        with self.lock:
+            self.used -= units
+
+
+# Function to read the error reason out of an API error body
+def error_reason(content):
+    try:
+        errors = json.loads(content)['error'].get('errors') or [{}]
+        return errors[0].get('reason')
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+class RequestScheduler:
+    def __init__(self, qps=10.0, burst=None, daily_quota=DEFAULT_DAILY_QUOTA, max_retries=5, base_delay=1.0, max_delay=64.0, state_path=None):
+        self.qps = qps
+        self.burst = burst or max(1.0, qps)
+        self.daily_quota = daily_quota
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.tokens = self.burst
+        self.last_refill = time.monotonic()
+        self.quota_day = self.today()
+        self.quota_exhausted = False
+        self.units_by_endpoint = {}
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.throttled_seconds = 0.0
+        # Units spent per quota day by every scheduler sharing the file, guarded by self.lock
+        self.conn = None
+        if state_path:
+            self.conn = sqlite3.connect(state_path, check_same_thread=False)
+            self.conn.executescript("""
+                PRAGMA journal_mode = WAL;
+                PRAGMA synchronous = NORMAL;
+                CREATE TABLE IF NOT EXISTS quota_usage (
+                    day TEXT NOT NULL,
+                    endpoint TEXT NOT NULL,
+                    units INTEGER NOT NULL,
+                    PRIMARY KEY (day, endpoint)
+                );
+            """)
+
+    @staticmethod
+    def today():
+        return datetime.now(QUOTA_TIMEZONE).date()
+
+    # Blocks until the token bucket allows one more request
+    def acquire(self):
+        if not self.qps:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.qps)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.qps
+                self.throttled_seconds += wait
+            with span('throttle'):
+                time.sleep(wait)
+
+    def reset_if_new_day(self):
+        today = self.today()
+        if today != self.quota_day:
+            self.quota_day = today
+            self.quota_exhausted = False
+            self.units_by_endpoint = {}
+
+    def record(self, endpoint, units):
+        with self.lock:
+            self.reset_if_new_day()
+            self.requests += 1
+            self.units_by_endpoint[endpoint] = self.units_by_endpoint.get(endpoint, 0) + units
+            if self.conn is not None:
+                with self.conn:
+                    self.conn.execute("""
+                        INSERT INTO quota_usage (day, endpoint, units) VALUES (?, ?, ?)
+                        ON CONFLICT (day, endpoint) DO UPDATE SET units = units + excluded.units
+                    """, (self.quota_day.isoformat(), endpoint, units))
+        increment('quota_units', units, endpoint=endpoint)
+
+    # Units this scheduler spent today
+    @property
+    def quota_used(self):
+        return sum(self.units_by_endpoint.values())
+
+    # Units spent today by every scheduler persisting to the same file; called with self.lock held
+    def quota_used_today(self):
+        if self.conn is None:
+            return self.quota_used
+        return self.conn.execute("SELECT COALESCE(SUM(units), 0) FROM quota_usage WHERE day = ?", (self.quota_day.isoformat(),)).fetchone()[0]
+
+    # Full-jitter exponential backoff, honouring Retry-After when the server sends one
+    def backoff(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return min(self.max_delay, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    # Sends one request through the bucket, retrying transient failures; every attempt is charged to budget if given
+    def send(self, http, uri, method, body, headers, budget=None, **kwargs):
+        endpoint = urlparse(uri).path.rstrip('/').rsplit('/', 1)[-1]
+        # A batch call is charged for each request it carries
+        units = body.count(b'Content-ID:' if isinstance(body, bytes) else 'Content-ID:') if endpoint == 'batch' and body else QUOTA_COSTS.get(endpoint, 1)
+
+        with self.lock:
+            self.reset_if_new_day()
+            if self.quota_exhausted:
+                raise QuotaExhaustedError(f"Daily YouTube API quota exhausted ({self.quota_used_today()}/{self.daily_quota} units used)")
+
+        attempt = 0
+        while True:
+            if budget is not None:
+                budget.reserve(units)
+            self.acquire()
+            try:
+                resp, content = http.request(uri, method=method, body=body, headers=headers, **kwargs)
+            except (OSError, httplib2.HttpLib2Error) as e:
+                if budget is not None:
+                    budget.refund(units)
+                if attempt >= self.max_retries:
+                    raise
+                with self.lock:
+                    self.retries += 1
+                increment('retries', endpoint=endpoint)
+                delay = self.backoff(attempt)
+                logging.warning(f"{endpoint} request failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            self.record(endpoint, units)
+            if resp.status < 400:
+                return resp, content
+
+            reason = error_reason(content)
+            if reason in ('quotaExceeded', 'dailyLimitExceeded'):
+                with self.lock:
+                    self.quota_exhausted = True
+                    self.errors += 1
+                return resp, content
+            if (resp.status in RETRYABLE_STATUSES or reason in RETRYABLE_REASONS) and attempt < self.max_retries:
+                with self.lock:
+                    self.retries += 1
+                increment('retries', endpoint=endpoint)
+                delay = self.backoff(attempt, resp.get('retry-after'))
+                logging.warning(f"{endpoint} returned {resp.status} ({reason}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            with self.lock:
+                self.errors += 1
+            return resp, content
+
+    # Handles a failed request carried in a batch call; send() only sees the batch, which succeeded.
+    # Returns the delay before the request is re-sent, or None when it should not be retried
+    def part_failed(self, endpoint, resp, content, attempt):
+        reason = error_reason(content)
+        if reason in ('quotaExceeded', 'dailyLimitExceeded'):
+            with self.lock:
+                self.quota_exhausted = True
+                self.errors += 1
+                used = self.quota_used_today()
+            raise QuotaExhaustedError(f"Daily YouTube API quota exhausted ({used}/{self.daily_quota} units used)")
+        if (resp.status in RETRYABLE_STATUSES or reason in RETRYABLE_REASONS) and attempt < self.max_retries:
+            with self.lock:
+                self.retries += 1
+            increment('retries', endpoint=endpoint)
+            delay = self.backoff(attempt, resp.get('retry-after'))
+            logging.warning(f"{endpoint} request in batch returned {resp.status} ({reason}), retrying in {delay:.1f}s")
+            return delay
+        with self.lock:
+            self.errors += 1
+        return None
+
+    def metrics(self):
+        with self.lock:
+            self.reset_if_new_day()
+            used_today = self.quota_used_today()
+            return {
+                'quota_used': self.quota_used,
+                'quota_used_today': used_today,
+                'quota_remaining': max(0, self.daily_quota - used_today),
+                'daily_quota': self.daily_quota,
+                'quota_exhausted': self.quota_exhausted,
+                'units_by_endpoint': dict(self.units_by_endpoint),
+                'requests': self.requests,
+                'retries': self.retries,
+                'errors': self.errors,
+                'throttled_seconds': round(self.throttled_seconds, 3),
+            }
+
+
+# httplib2.Http drop-in that sends every request through a RequestScheduler
+class ScheduledHttp:
+    def __init__(self, scheduler, http=None, budget=None):
+        self.scheduler = scheduler
+        self.http = http or build_http()
+        self.budget = budget
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        return self.scheduler.send(self.http, uri, method, body, headers, budget=self.budget, redirections=redirections, connection_type=connection_type)
+
+    def close(self):
+        self.http.close()
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
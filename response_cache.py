@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Persistent on-disk cache for YouTube Data API responses.
+# CachingHttp wraps the httplib2 client that build() uses, so every GET issued
+# through the API client is served from disk while its endpoint TTL holds.
+
+import json
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+import httplib2
+from googleapiclient.http import build_http
+
+from instrumentation import increment
+
+DEFAULT_CACHE_PATH = 'youtube-cache.db'
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Seconds a response stays fresh, keyed by the last path segment of the endpoint
+DEFAULT_TTLS = {
+    'videos': 3600,
+    'commentThreads': 900,
+    'comments': 900,
+}
+
+
+class ResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttls=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.max_bytes = max_bytes
+        self.hits = {}
+        self.misses = {}
+        self.lock = threading.Lock()
+        # Shared by the scraper threads and Streamlit's per-rerun threads, guarded by self.lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # Every hit updates last_access, so WAL without per-commit fsync keeps lookups cheap; a lost write only costs a refetch
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                headers TEXT NOT NULL,
+                content BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+        """)
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    # Builds a cache key from the request URI, ignoring parameter order and the API key
+    @staticmethod
+    def make_key(uri):
+        url = urlparse(uri)
+        params = sorted((k, v) for k, v in parse_qsl(url.query) if k != 'key')
+        return f"{url.path}?{urlencode(params)}"
+
+    @staticmethod
+    def endpoint(uri):
+        return urlparse(uri).path.rstrip('/').rsplit('/', 1)[-1]
+
+    def get(self, uri):
+        endpoint = self.endpoint(uri)
+        ttl = self.ttls.get(endpoint)
+        if not ttl:
+            return None
+        key = self.make_key(uri)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT headers, content, size, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[3] + ttl < now:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.conn.commit()
+                self.total_bytes -= row[2]
+                row = None
+            if row is None:
+                self.misses[endpoint] = self.misses.get(endpoint, 0) + 1
+                increment('cache_misses', cache='response', endpoint=endpoint)
+                return None
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits[endpoint] = self.hits.get(endpoint, 0) + 1
+        increment('cache_hits', cache='response', endpoint=endpoint)
+        return json.loads(row[0]), row[1]
+
+    def put(self, uri, headers, content):
+        endpoint = self.endpoint(uri)
+        if not self.ttls.get(endpoint) or len(content) > self.max_bytes:
+            return
+        key = self.make_key(uri)
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self.total_bytes -= old[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, headers, content, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, json.dumps(headers), content, len(content), now, now),
+            )
+            self.total_bytes += len(content)
+            self.evict()
+            self.conn.commit()
+
+    # Drops least recently used responses until the cache fits in max_bytes; called with self.lock held
+    def evict(self):
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute("SELECT key, size FROM responses ORDER BY last_access LIMIT 100").fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            for key, size in rows:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                'hits': sum(self.hits.values()),
+                'misses': sum(self.misses.values()),
+                'hits_by_endpoint': dict(self.hits),
+                'misses_by_endpoint': dict(self.misses),
+                'entries': entries,
+                'bytes': self.total_bytes,
+            }
+
+    def close(self):
+        self.conn.close()
+
+
+# httplib2.Http drop-in that answers GET requests from a ResponseCache
+class CachingHttp:
+    def __init__(self, cache, http=None):
+        self.cache = cache
+        self.http = http or build_http()
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        if method == 'GET':
+            cached = self.cache.get(uri)
+            if cached is not None:
+                info, content = cached
+                return httplib2.Response(info), content
+        resp, content = self.http.request(uri, method=method, body=body, headers=headers, redirections=redirections, connection_type=connection_type)
+        if method == 'GET' and resp.status == 200:
+            self.cache.put(uri, dict(resp), content)
+        return resp, content
+
+    def close(self):
+        self.http.close()
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Background comment scraping for the Streamlit app.
+# A ScrapeJob runs the page loop on its own thread and only publishes state
+# (pages, rows, progress, partial results); the UI polls that state on every
+# rerun instead of blocking until the last page arrives, and can cancel the job.
+# The page loop runs on an asyncio client, so the comment count lookup, the next
+# commentThreads page and the current page's reply fetches overlap. Sentiment is
+# labelled on a thread of its own, so NLP work never stalls the page loop.
+
+import asyncio
+import logging
+import queue
+import threading
+from collections import Counter, deque
+from contextlib import aclosing
+
+import pandas as pd
+
+from async_youtube import AsyncYouTube, iter_comment_pages, video_statistics
+from checkpoint import CheckpointStore, DEFAULT_CHECKPOINT_PATH
+from comment_frame import CommentFrameBuilder, sentiment_categorical, SENTIMENT_CATEGORIES
+from comment_sink import open_sink
+from instrumentation import span, increment
+from sentiment import analyze_sentiments
+from youtube_api import COMMENT_COLUMNS
+
+
+# Newest rows kept for the live view
+RECENT_ROWS = 100
+
+
+class ScrapeCancelled(Exception):
+    pass
+
+
+class ScrapeJob:
+    """One video scrape, run in the calling thread (run) or in the background (start).
+
+    The shared caches, scheduler and stores are created by the caller, so a
+    Streamlit session can hand in its st.cache_resource singletons; everything
+    bound to a thread (the event loop, the checkpoint connection) is created
+    inside run().
+    """
+
+    def __init__(self, api_key, video_id, since=None, sentiment_backend="textblob", output_path=None, response_cache=None,
+                 scheduler=None, store=None, feature_cache=None, checkpoint_path=DEFAULT_CHECKPOINT_PATH, api_endpoint=None):
+        self.api_key = api_key
+        self.video_id = video_id
+        self.since = since
+        self.sentiment_backend = sentiment_backend
+        self.output_path = output_path
+        self.response_cache = response_cache
+        self.scheduler = scheduler
+        self.store = store
+        self.feature_cache = feature_cache
+        self.checkpoint_path = checkpoint_path
+        self.api_endpoint = api_endpoint
+
+        self.status = "pending"
+        self.error = None
+        self.pages = 0
+        self.rows = 0
+        self.resumed_rows = 0
+        # Comments the video is expected to have (new ones only for incremental scrapes); None if unknown
+        self.expected = None
+        self.frame = CommentFrameBuilder()
+        self.sentiments = []
+        # Running aggregates for the live view, so polling never touches the full frame
+        self.sentiment_counts = Counter()
+        self.daily_counts = Counter()
+        self.recent = deque(maxlen=RECENT_ROWS)
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        self.thread = None
+        # Pages waiting for sentiment labels; None tells the labeller the scrape is over
+        self.pending = queue.Queue()
+        self.label_error = None
+
+    @property
+    def checkpoint_key(self):
+        return f"app:{self.video_id}" if self.since is None else f"app:{self.video_id}:since:{self.since.isoformat()}"
+
+    @property
+    def running(self):
+        return self.status in ("pending", "running")
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=f"scrape-{self.video_id}", daemon=True)
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    # Fraction of the expected comments scraped so far, or None while the total is unknown
+    def progress(self):
+        if not self.expected:
+            return None
+        return min(self.rows / self.expected, 1.0)
+
+    # Stores one page and queues it for labelling; called with every fetched or replayed page
+    def add_page(self, comments):
+        with self.lock:
+            self.frame.add_page(comments)
+            self.pages += 1
+            self.rows += len(comments)
+            self.recent.extend(comments)
+            self.daily_counts.update(comment[3][:10] for comment in comments)
+        self.pending.put([comment[1] for comment in comments])
+        increment('pages', scraper='app')
+        increment('rows', len(comments), scraper='app')
+
+    # Labels queued pages in order; everything that queued up while a batch ran becomes the next batch,
+    # so a replayed checkpoint or a fast scrape reaches analyze_sentiments' process pool in one call
+    def label_pages(self):
+        done = False
+        while not done:
+            pages = [self.pending.get()]
+            while True:
+                try:
+                    pages.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            if pages[-1] is None:
+                done = True
+                pages.pop()
+            if self.label_error is not None:
+                continue
+            try:
+                labels = analyze_sentiments([text for page in pages for text in page], backend=self.sentiment_backend, cache=self.feature_cache)
+            except Exception as e:
+                self.label_error = e
+                continue
+            with self.lock:
+                self.sentiments.extend(labels)
+                self.sentiment_counts.update(labels)
+
+    # Returns the comments scraped so far, with sentiment (missing while still being labelled); costs a full frame build
+    def snapshot(self):
+        with self.lock:
+            df = self.frame.to_pandas()
+            labels = self.sentiments[:len(df)]
+            df['Sentiment'] = sentiment_categorical(labels + [None] * (len(df) - len(labels)))
+        return df
+
+    # Returns the live view's numbers: labelled sentiment counts, comments per day and the newest rows
+    def summary(self):
+        with self.lock:
+            return {
+                'rows': self.rows,
+                'sentiment_counts': pd.Series(self.sentiment_counts, dtype='int64').reindex(SENTIMENT_CATEGORIES, fill_value=0),
+                'daily_counts': pd.Series(self.daily_counts, dtype='int64').rename(index=pd.Timestamp).sort_index().rename("Comments"),
+                'recent': pd.DataFrame(list(self.recent), columns=COMMENT_COLUMNS),
+            }
+
+    async def expected_comments(self, client):
+        statistics = (await video_statistics(client, [self.video_id])).get(self.video_id, {})
+        if "commentCount" not in statistics:
+            return None
+        expected = int(statistics["commentCount"])
+        if self.since is not None and self.store is not None:
+            expected -= self.store.count(self.video_id)
+        return max(expected, 0)
+
+    async def scrape(self, client, sink, checkpoints):
+        # The count only sizes the progress bar, so failing to get it must not fail the scrape
+        async def lookup_expected():
+            try:
+                self.expected = await self.expected_comments(client)
+            except Exception as e:
+                logging.warning(f"Could not look up the comment count of {self.video_id}: {e}")
+
+        # The comment count arrives while the first pages are already being fetched
+        expected = asyncio.ensure_future(lookup_expected())
+        try:
+            next_page_token = None
+            state = checkpoints.load(self.checkpoint_key) if checkpoints else None
+            if state:
+                for comments in checkpoints.iter_pages(self.checkpoint_key):
+                    self.add_page(comments)
+                    if sink:
+                        sink.write_rows(comments)
+                self.resumed_rows = self.rows
+                next_page_token = state["next_page_token"]
+
+            if state is None or next_page_token:
+                if self.cancel_event.is_set():
+                    raise ScrapeCancelled()
+                pages = iter_comment_pages(client, self.video_id, next_page_token, since=self.since, store=self.store)
+                async with aclosing(pages):
+                    async for comments, next_page_token in pages:
+                        if sink:
+                            sink.write_rows(comments)
+                        if checkpoints:
+                            checkpoints.save_page(self.checkpoint_key, self.pages, comments, next_page_token)
+                        self.add_page(comments)
+                        if next_page_token and self.cancel_event.is_set():
+                            raise ScrapeCancelled()
+            await expected
+        finally:
+            expected.cancel()
+
+    def run(self):
+        self.status = "running"
+        client = AsyncYouTube(self.api_key, cache=self.response_cache, scheduler=self.scheduler, api_endpoint=self.api_endpoint)
+        sink = open_sink(self.output_path, COMMENT_COLUMNS) if self.output_path else None
+        # Completed pages are checkpointed, so a failed or cancelled scrape resumes instead of restarting
+        checkpoints = CheckpointStore(self.checkpoint_path) if self.checkpoint_path else None
+        labeller = threading.Thread(target=self.label_pages, name=f"label-{self.video_id}", daemon=True)
+        labeller.start()
+        try:
+            try:
+                with span('scrape', scraper='app'):
+                    asyncio.run(self.scrape(client, sink, checkpoints))
+            finally:
+                # Every page is labelled before the job reports its final state
+                self.pending.put(None)
+                labeller.join()
+            if self.label_error is not None:
+                raise self.label_error
+            if checkpoints:
+                checkpoints.finish(self.checkpoint_key)
+            # Only a finished scrape moves the incremental watermark; an unfinished one resumes from its checkpoint
+            if self.store is not None:
+                self.store.mark_scraped(self.video_id)
+            self.status = "done"
+        except ScrapeCancelled:
+            self.status = "cancelled"
+        except Exception as e:
+            logging.error(f"Error scraping comments: {e}")
+            self.error = e
+            self.status = "failed"
+        finally:
+            if sink:
+                sink.close()
+            if checkpoints:
+                checkpoints.close()
+        return self
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Batched sentiment analysis for scraped comments.
+# Runs over a whole column at once, split into chunks across a process pool, with
+# either the TextBlob analyzer or a faster lexicon lookup built from the same scores.
+
+import re
+
+from instrumentation import span
+from parallel import map_chunks
+from text_features import cached_map
+
+CHUNK_SIZE = 2000
+# Comments needed before labelling moves to a process pool
+PARALLEL_THRESHOLD = 5000
+
+TOKEN_PATTERN = re.compile(r"[a-z']+|[:;=8][\-o\*']?[\)\]\(\[dpDP/\\]")
+NEGATIONS = {"no", "not", "n't", "never", "dont", "don't", "cant", "can't", "isnt", "isn't"}
+
+# Word -> polarity table, loaded once per process by load_lexicon()
+LEXICON = None
+
+
+# Function to map a polarity score to the labels used across the app
+def polarity_label(polarity):
+    if polarity > 0:
+        return 'Positive'
+    elif polarity == 0:
+        return 'Neutral'
+    else:
+        return 'Negative'
+
+
+# Function to label a chunk of comments with TextBlob, computing polarity once per comment
+def textblob_labels(texts):
+    from textblob import TextBlob
+    return [polarity_label(TextBlob(text).sentiment.polarity) for text in texts]
+
+
+# Function to build the word -> polarity table from TextBlob's pattern lexicon
+def load_lexicon():
+    global LEXICON
+    if LEXICON is None:
+        from textblob.en import sentiment as pattern_sentiment
+        pattern_sentiment.load()
+        lexicon = {}
+        for word, scores in pattern_sentiment.items():
+            # The None entry holds the polarity averaged over the word's parts of speech
+            polarity = (scores.get(None) or next(iter(scores.values())))[0]
+            if polarity:
+                lexicon[word.lower()] = polarity
+        LEXICON = lexicon
+    return LEXICON
+
+
+# Function to score one comment as the mean polarity of its lexicon words, flipping words after a negation
+def lexicon_polarity(text, lexicon):
+    total = 0.0
+    matched = 0
+    negate = False
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in NEGATIONS:
+            negate = True
+            continue
+        score = lexicon.get(token)
+        if score is not None:
+            total += -0.5 * score if negate else score
+            matched += 1
+        negate = False
+    return total / matched if matched else 0.0
+
+
+# Function to label a chunk of comments with the lexicon backend
+def lexicon_labels(texts):
+    lexicon = load_lexicon()
+    return [polarity_label(lexicon_polarity(text, lexicon)) for text in texts]
+
+
+BACKENDS = {
+    'textblob': textblob_labels,
+    'lexicon': lexicon_labels,
+}
+
+
+# Function to label distinct texts, in chunks spread over a process pool for large inputs
+def label_texts(texts, backend, processes=None, chunk_size=CHUNK_SIZE):
+    chunks = map_chunks(BACKENDS[backend], [texts], processes=processes, chunk_size=chunk_size, threshold=PARALLEL_THRESHOLD)
+    return [label for chunk_labels in chunks for label in chunk_labels]
+
+
+# Function to label every comment in a column
+def analyze_sentiments(texts, backend='textblob', processes=None, chunk_size=CHUNK_SIZE, cache=None):
+    """Computes sentiment labels for a whole list or Series of comments.
+
+    Identical comments are analyzed once, and with a FeatureCache labels from
+    earlier runs are reused, so only never-seen texts reach the analyzer.
+
+    Args:
+        texts: The comment texts.
+        backend: 'textblob' (matches the original per-comment analysis) or 'lexicon' (faster word lookup).
+        processes: Worker processes; defaults to the CPU count, 1 disables the pool.
+        chunk_size: Comments per task sent to a worker.
+        cache: Optional text_features.FeatureCache.
+
+    Returns:
+        A list of 'Positive', 'Neutral' or 'Negative' labels in input order.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown sentiment backend: {backend}")
+    texts = [text if isinstance(text, str) else "" for text in texts]
+    with span('sentiment', backend=backend):
+        return cached_map(texts, f"sentiment:{backend}:v1", lambda batch: label_texts(batch, backend, processes, chunk_size), cache)
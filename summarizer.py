@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Map-reduce comment summarization for Gemini.
+# Comments are packed into chunks that fit the prompt budget, every chunk is
+# summarized by its own stateless generate_content call, and the partial summaries
+# are reduced the same way until one summary is left. Chunk summaries are cached
+# by content hash, so a rerun after new comments only pays for the chunks that changed.
+
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import span, timed
+from text_features import comment_hash
+
+# Prompt tokens per call, well inside gemini-1.5-flash's context window
+CHUNK_TOKENS = 30000
+# Rough English average; a character-based estimate avoids a count_tokens round trip per comment
+CHARS_PER_TOKEN = 4
+MAX_WORKERS = 4
+SUMMARY_FEATURE = 'summary:v1'
+
+MAP_PROMPT = "Summarize the following YouTube comments:\n\n{text}"
+REDUCE_PROMPT = "Combine these partial summaries of a video's YouTube comments into one summary:\n\n{text}"
+
+
+# Function to estimate the prompt tokens of a text
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+# Function to pack texts, in order, into chunks of at most max_tokens estimated tokens
+def chunk_texts(texts, max_tokens=CHUNK_TOKENS):
+    chunks = []
+    chunk = []
+    size = 0
+    for text in texts:
+        # A single comment longer than the budget is cut rather than overflowing the prompt
+        text = text[:max_tokens * CHARS_PER_TOKEN]
+        tokens = estimate_tokens(text)
+        if chunk and size + tokens > max_tokens:
+            chunks.append("\n\n".join(chunk))
+            chunk = []
+            size = 0
+        chunk.append(text)
+        size += tokens
+    if chunk:
+        chunks.append("\n\n".join(chunk))
+    return chunks
+
+
+# Function to summarize every chunk with one fresh model call each, reusing cached summaries
+def summarize_chunks(model, chunks, prompt, cache=None, max_workers=MAX_WORKERS):
+    keys = [comment_hash(prompt.format(text=chunk)) for chunk in chunks]
+    summaries = cache.get_many(SUMMARY_FEATURE, keys) if cache is not None else {}
+    missing = {key: chunk for key, chunk in zip(keys, chunks) if key not in summaries}
+    if missing:
+        def summarize(chunk):
+            with span('gemini_call'):
+                return model.generate_content(prompt.format(text=chunk)).text.strip()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            computed = dict(zip(missing, executor.map(summarize, missing.values())))
+        if cache is not None:
+            cache.put_many(SUMMARY_FEATURE, computed)
+        summaries.update(computed)
+    return [summaries[key] for key in keys]
+
+
+# Function to summarize comments of any size
+@timed('summary')
+def summarize_comments(model, comments, cache=None, max_tokens=CHUNK_TOKENS, max_workers=MAX_WORKERS):
+    """Summarizes all comments in the list with map-reduce over prompt-sized chunks.
+
+    Args:
+        model: Anything with a Gemini-style generate_content(prompt) returning an
+            object with .text, e.g. genai.GenerativeModel or a local fake.
+        comments: A list of comments to summarize; pass them oldest first so new
+            comments only change the last chunks and earlier summaries stay cached.
+        cache: Optional text_features.FeatureCache holding chunk summaries.
+        max_tokens: Estimated prompt tokens per call.
+        max_workers: Concurrent model calls.
+
+    Returns:
+        A string containing the summary of all comments.
+
+    Raises:
+        Whatever the model call raised. Chunks summarized before the failure
+        stay cached, so a retry only pays for the rest.
+    """
+    comments = [comment for comment in comments if isinstance(comment, str) and comment]
+    if not comments:
+        return "No comments to summarize."
+
+    summaries = summarize_chunks(model, chunk_texts(comments, max_tokens), MAP_PROMPT, cache, max_workers)
+    # Reduce until the partial summaries fit a single call
+    while len(summaries) > 1:
+        chunks = chunk_texts(summaries, max_tokens)
+        if len(chunks) == len(summaries):
+            # Summaries too long to pack: pair them up so every round still shrinks
+            chunks = ["\n\n".join(summaries[i:i + 2]) for i in range(0, len(summaries), 2)]
+        summaries = summarize_chunks(model, chunks, REDUCE_PROMPT, cache, max_workers)
+    return summaries[0]
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Content-addressed cache for per-comment derived features (sentiment labels, tokens).
+# Features are keyed by a hash of the comment text, so duplicate comments and
+# rescrapes of the same video reuse earlier results instead of redoing NLP work.
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+
+from instrumentation import increment
+
+DEFAULT_FEATURE_CACHE_PATH = 'comment-features.db'
+
+# Hashes looked up per SQLite query, below the bound-parameter limit
+LOOKUP_CHUNK = 500
+
+# Same token rule WordCloud applies before counting words
+WORD_PATTERN = re.compile(r"\w[\w']*")
+TOKENS_FEATURE = 'tokens:v1'
+
+
+# Function to hash a comment's text into its cache key
+def comment_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class FeatureCache:
+    def __init__(self, path=DEFAULT_FEATURE_CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS features (
+                hash TEXT NOT NULL,
+                feature TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (feature, hash)
+            )
+        """)
+        self.conn.commit()
+
+    # Returns {hash: value} for the hashes that already have this feature
+    def get_many(self, feature, hashes):
+        found = {}
+        with self.lock:
+            for start in range(0, len(hashes), LOOKUP_CHUNK):
+                chunk = hashes[start:start + LOOKUP_CHUNK]
+                query = f"SELECT hash, value FROM features WHERE feature = ? AND hash IN ({','.join('?' * len(chunk))})"
+                for key, value in self.conn.execute(query, [feature, *chunk]):
+                    found[key] = json.loads(value)
+            self.hits += len(found)
+            self.misses += len(hashes) - len(found)
+        increment('cache_hits', len(found), cache=feature)
+        increment('cache_misses', len(hashes) - len(found), cache=feature)
+        return found
+
+    def put_many(self, feature, values):
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO features (hash, feature, value) VALUES (?, ?, ?)",
+                [(key, feature, json.dumps(value)) for key, value in values.items()],
+            )
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM features").fetchone()[0]
+            return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
+
+    def close(self):
+        self.conn.close()
+
+
+# Function to compute a feature for every text, running compute only once per distinct uncached text
+def cached_map(texts, feature, compute, cache=None):
+    """Maps compute over texts, deduplicated and memoized by content hash.
+
+    Args:
+        texts: The comment texts.
+        feature: Feature name; include a version so changed logic does not reuse stale values.
+        compute: Function taking a list of distinct texts and returning one value per text.
+        cache: Optional FeatureCache persisting the values across runs.
+
+    Returns:
+        A list of values in the same order as texts.
+    """
+    hashes = [comment_hash(text) for text in texts]
+    unique = dict(zip(hashes, texts))
+    values = cache.get_many(feature, list(unique)) if cache is not None else {}
+    missing = [key for key in unique if key not in values]
+    if missing:
+        computed = dict(zip(missing, compute([unique[key] for key in missing])))
+        if cache is not None:
+            cache.put_many(feature, computed)
+        values.update(computed)
+    return [values[key] for key in hashes]
+
+
+# Function to split comments into lowercase word tokens, cached by content hash
+def tokenize_comments(texts, cache=None):
+    texts = [text if isinstance(text, str) else "" for text in texts]
+    return cached_map(texts, TOKENS_FEATURE, lambda batch: [WORD_PATTERN.findall(text.lower()) for text in batch], cache)
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Topic extraction that scales to large comment sets.
+# Tokens are stopword-filtered and the vocabulary pruned with filter_extremes,
+# documents are streamed into online LDA in chunks, and each video's model is kept
+# on disk and updated with only the comments it has not been trained on yet.
+
+import json
+import os
+import random
+
+from gensim import corpora
+from gensim.models import LdaModel, LdaMulticore
+from gensim.parsing.preprocessing import STOPWORDS
+
+from instrumentation import span, timed
+from text_features import tokenize_comments, comment_hash
+
+DEFAULT_TOPIC_MODEL_DIR = 'topic-models'
+MIN_TOKEN_LENGTH = 3
+CHUNK_SIZE = 2000
+# Total documents the trainer sees across passes; small videos get several passes, large ones one online pass
+PASS_BUDGET = 20000
+PREVIEW_PASSES = 2
+KEEP_N = 20000
+
+
+# Re-iterable bag-of-words view over token lists, converted one document at a time.
+# A document standing for a cluster of near-duplicates has its word counts scaled by the cluster size.
+class BowCorpus:
+    def __init__(self, dictionary, documents, weights=None):
+        self.dictionary = dictionary
+        self.documents = documents
+        self.weights = weights
+
+    def __iter__(self):
+        for index, document in enumerate(self.documents):
+            bow = self.dictionary.doc2bow(document)
+            if self.weights is not None and self.weights[index] != 1:
+                bow = [(token_id, count * self.weights[index]) for token_id, count in bow]
+            yield bow
+
+    def __len__(self):
+        return len(self.documents)
+
+
+# Function to turn comments into topic documents: cached tokens minus stopwords, numbers and short words.
+# Returns the non-empty documents and their weights (1 each unless weights are given).
+def topic_documents(texts, weights=None, stopwords=STOPWORDS, cache=None):
+    texts = list(texts)
+    weights = [1] * len(texts) if weights is None else [int(weight) for weight in weights]
+    documents = []
+    document_weights = []
+    for tokens, weight in zip(tokenize_comments(texts, cache=cache), weights):
+        document = [token for token in tokens if len(token) >= MIN_TOKEN_LENGTH and token not in stopwords and not token.isdigit()]
+        if document:
+            documents.append(document)
+            document_weights.append(weight)
+    return documents, document_weights
+
+
+# Function to pick the LDA worker count: one process per core, leaving one for gensim's master process
+def topic_workers():
+    return max((os.cpu_count() or 1) - 1, 1)
+
+
+# Function to build a pruned dictionary for a set of documents
+def build_dictionary(documents):
+    dictionary = corpora.Dictionary(documents)
+    # Words must appear in a few comments to be a topic word, scaled down for small videos
+    no_below = max(1, min(5, len(documents) // 1000))
+    dictionary.filter_extremes(no_below=no_below, no_above=0.5, keep_n=KEEP_N)
+    return dictionary
+
+
+# Function to train online LDA over a streamed corpus
+@timed('lda', mode='train')
+def train_lda(documents, dictionary, num_topics, weights=None, passes=None):
+    corpus = BowCorpus(dictionary, documents, weights)
+    passes = passes or max(1, min(10, PASS_BUDGET // max(len(documents), 1)))
+    if (os.cpu_count() or 1) > 1:
+        return LdaMulticore(corpus, num_topics=num_topics, id2word=dictionary, chunksize=CHUNK_SIZE, passes=passes, workers=topic_workers(), random_state=0)
+    return LdaModel(corpus, num_topics=num_topics, id2word=dictionary, chunksize=CHUNK_SIZE, passes=passes, update_every=1, random_state=0)
+
+
+# Function to train a throwaway model on a random sample of comments, for quick previews
+def sample_topics(texts, num_topics=5, sample_size=2000, seed=0, weights=None, cache=None):
+    texts = list(texts)
+    weights = [1] * len(texts) if weights is None else list(weights)
+    if len(texts) > sample_size:
+        sample = sorted(random.Random(seed).sample(range(len(texts)), sample_size))
+        texts = [texts[index] for index in sample]
+        weights = [weights[index] for index in sample]
+    documents, weights = topic_documents(texts, weights, cache=cache)
+    dictionary = build_dictionary(documents)
+    if not documents or len(dictionary) == 0:
+        return None
+    return train_lda(documents, dictionary, num_topics, weights, passes=PREVIEW_PASSES)
+
+
+# Function to get a video's topic model, training it once and then updating it with new comments only
+def video_topics(video_id, texts, num_topics=5, weights=None, model_dir=DEFAULT_TOPIC_MODEL_DIR, cache=None):
+    """Returns the LDA model for a video, persisted under model_dir.
+
+    The first call trains on every comment. Later calls load the saved model
+    and run an online update over the comments whose content hash it has not
+    been trained on, so rescrapes only pay for new comments, and a model first
+    built from a partial (e.g. cancelled) scrape still learns the older comments
+    a later full scrape brings in. The vocabulary is fixed at the first
+    training; unseen words in new comments are ignored.
+
+    Args:
+        video_id: The video the comments belong to.
+        texts: The comment texts.
+        num_topics: Number of topics; each count gets its own saved model.
+        weights: Optional per-comment weights, e.g. near-duplicate cluster sizes.
+        model_dir: Directory for saved models.
+        cache: Optional text_features.FeatureCache for the tokens.
+
+    Returns:
+        The trained model, or None if the comments hold no usable words.
+    """
+    path = os.path.join(model_dir, f"{video_id}-k{num_topics}")
+    meta_path = os.path.join(path, "meta.json")
+    # Content hashes of every comment the model has been trained on, one per line
+    trained_path = os.path.join(path, "trained.txt")
+    texts = [text if isinstance(text, str) else "" for text in texts]
+    weights = [1] * len(texts) if weights is None else list(weights)
+    hashes = [comment_hash(text) for text in texts]
+
+    # Models saved before trained.txt existed are retrained once
+    if os.path.exists(meta_path) and os.path.exists(trained_path):
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(trained_path, encoding='utf-8') as f:
+            trained = set(f.read().split())
+        lda = LdaModel.load(os.path.join(path, "lda"))
+        new = [index for index, key in enumerate(hashes) if key not in trained]
+        if not new:
+            return lda
+        documents, weights = topic_documents([texts[index] for index in new], [weights[index] for index in new], cache=cache)
+        corpus = [bow for bow in BowCorpus(lda.id2word, documents, weights) if bow]
+        if corpus:
+            # LdaMulticore.update (saved on multi-core hosts) takes no chunksize, so set it on the model
+            lda.chunksize = CHUNK_SIZE
+            with span('lda', mode='update'):
+                lda.update(corpus)
+            meta['documents'] += len(corpus)
+        # Comments without usable words are recorded too, so they are not tokenized again on every call
+        new_hashes = [hashes[index] for index in new]
+    else:
+        documents, weights = topic_documents(texts, weights, cache=cache)
+        dictionary = build_dictionary(documents)
+        if not documents or len(dictionary) == 0:
+            return None
+        lda = train_lda(documents, dictionary, num_topics, weights)
+        meta = {'documents': len(documents)}
+        new_hashes = hashes
+        trained = set()
+
+    os.makedirs(path, exist_ok=True)
+    lda.save(os.path.join(path, "lda"))
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    # A fresh model starts a new file; updates append the comments they added
+    with open(trained_path, 'a' if trained else 'w', encoding='utf-8') as f:
+        f.writelines(f"{key}\n" for key in dict.fromkeys(new_hashes))
+    return lda
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Word-cloud frequencies for large comment sets.
+# Token counts are computed in chunks across a process pool, with stopwords
+# dropped as they are counted, and kept per video on disk: after a rescrape only
+# comments that are new (or whose near-duplicate cluster grew) are counted again.
+
+import sqlite3
+import threading
+from collections import Counter
+
+from instrumentation import timed
+from parallel import map_chunks
+from text_features import WORD_PATTERN, comment_hash
+
+DEFAULT_WORD_COUNT_PATH = 'word-counts.db'
+CHUNK_SIZE = 5000
+# Counting is cheap per comment, so the pool only pays off for much larger inputs than sentiment
+PARALLEL_THRESHOLD = 20000
+
+
+# Function to count the words of one chunk, each comment counted weight times
+def count_chunk(texts, weights, stopwords):
+    counts = Counter()
+    for text, weight in zip(texts, weights):
+        for token in WORD_PATTERN.findall(text.lower()):
+            if token not in stopwords and not token.isdigit():
+                counts[token] += weight
+    return counts
+
+
+# Function to count words over many comments, in chunks spread over a process pool for large inputs
+def count_words(texts, weights=None, stopwords=frozenset(), processes=None, chunk_size=CHUNK_SIZE):
+    texts = [text if isinstance(text, str) else "" for text in texts]
+    weights = [1] * len(texts) if weights is None else [int(weight) for weight in weights]
+    counts = Counter()
+    for chunk_counts in map_chunks(count_chunk, [texts, weights], [stopwords], processes, chunk_size, PARALLEL_THRESHOLD):
+        counts.update(chunk_counts)
+    return counts
+
+
+class WordCountCache:
+    def __init__(self, path=DEFAULT_WORD_COUNT_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS counted (
+                dataset TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                weight INTEGER NOT NULL,
+                PRIMARY KEY (dataset, hash)
+            );
+            CREATE TABLE IF NOT EXISTS words (
+                dataset TEXT NOT NULL,
+                word TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (dataset, word)
+            );
+        """)
+
+    @timed('word_counts')
+    def frequencies(self, video_id, texts, weights=None, stopwords=frozenset(), processes=None):
+        """Returns the word frequencies of a video's comments, merged into its saved counts.
+
+        Every comment is remembered by content hash with the weight it was
+        counted with, so a rescrape only counts comments that are new or whose
+        weight (near-duplicate cluster size) changed. If a previously counted
+        comment is gone, the video is counted again from scratch.
+
+        Args:
+            video_id: The video the comments belong to.
+            texts: The comment texts, e.g. one representative per near-duplicate cluster.
+            weights: Optional weight per comment, e.g. the cluster sizes.
+            stopwords: Words left out of the counts.
+            processes: Worker processes for count_words.
+
+        Returns:
+            A Counter of word -> weighted count.
+        """
+        # Counts made with other stopwords are kept apart
+        dataset = f"{video_id}:{comment_hash(' '.join(sorted(stopwords)))[:8]}"
+        weights = [1] * len(texts) if weights is None else [int(weight) for weight in weights]
+        current = Counter()
+        unique = {}
+        for text, weight in zip(texts, weights):
+            text = text if isinstance(text, str) else ""
+            key = comment_hash(text)
+            current[key] += weight
+            unique[key] = text
+
+        with self.lock:
+            counted = dict(self.conn.execute("SELECT hash, weight FROM counted WHERE dataset = ?", (dataset,)))
+            if any(key not in current for key in counted):
+                counted = {}
+                with self.conn:
+                    self.conn.execute("DELETE FROM counted WHERE dataset = ?", (dataset,))
+                    self.conn.execute("DELETE FROM words WHERE dataset = ?", (dataset,))
+            frequencies = Counter(dict(self.conn.execute("SELECT word, count FROM words WHERE dataset = ?", (dataset,))))
+
+        changed = {key: weight - counted.get(key, 0) for key, weight in current.items() if weight != counted.get(key, 0)}
+        if not changed:
+            return +frequencies
+        delta = count_words([unique[key] for key in changed], list(changed.values()), stopwords, processes)
+        frequencies.update(delta)
+
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO counted (dataset, hash, weight) VALUES (?, ?, ?)",
+                                  [(dataset, key, current[key]) for key in changed])
+            self.conn.executemany("INSERT OR REPLACE INTO words (dataset, word, count) VALUES (?, ?, ?)",
+                                  [(dataset, word, frequencies[word]) for word in delta])
+        return +frequencies
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#!/bin/env python3
+# Shared YouTube Data API helpers used by app.py and "YT Scraper.py".
+
+import re
+
+from pooled_http import shared_http
+from request_scheduler import ScheduledHttp
+from response_cache import CachingHttp
+
+# Requests per batch call; each inner request still costs its own quota unit
+REPLY_BATCH_SIZE = 50
+
+COMMENT_COLUMNS = ["Name", "Comment", "Likes", "Time", "Reply Count"]
+
+
+# Function to extract video ID from YouTube URL
+def extract_video_id(url):
+    patterns = [
+        r"(?<=v=)[^&]+",
+        r"(?<=be\/)[^?]+",
+        r"(?<=embed\/)[^\"?]+",
+        r"(?<=youtu.be\/)[^\"?]+"
+    ]
+    for pattern in patterns:
+        video_id = re.search(pattern, url)
+        if video_id:
+            return video_id.group(0)
+    return None
+
+
+# Function to layer an optional ResponseCache and RequestScheduler over the process-wide pooled session.
+# Cache hits are answered before the scheduler, so they spend neither rate tokens nor quota (nor budget).
+def youtube_http(cache=None, scheduler=None, budget=None):
+    http = shared_http()
+    if scheduler is not None:
+        http = ScheduledHttp(scheduler, http, budget)
+    if cache is not None:
+        http = CachingHttp(cache, http)
+    return http
+
+
+# Function to check whether the inline replies of a comment thread are incomplete
+def needs_reply_completion(thread):
+    inline = len(thread.get("replies", {}).get("comments", []))
+    return inline < thread["snippet"]["totalReplyCount"]
+
+
+# Function to turn commentThreads items into rows, each thread followed by its replies
+def comment_rows(threads, completed_replies, reply_count=0):
+    rows = []
+    for item in threads:
+        comment = item["snippet"]["topLevelComment"]["snippet"]
+        rows.append([
+            comment["authorDisplayName"],
+            comment["textDisplay"],
+            comment["likeCount"],
+            comment["publishedAt"],
+            item["snippet"]["totalReplyCount"]
+        ])
+
+        thread_replies = completed_replies.get(item["snippet"]["topLevelComment"]["id"], item.get("replies", {}).get("comments", []))
+        for reply in thread_replies:
+            reply_comment = reply["snippet"]
+            rows.append([
+                reply_comment["authorDisplayName"],
+                reply_comment["textDisplay"],
+                reply_comment["likeCount"],
+                reply_comment["publishedAt"],
+                reply_count
+            ])
+    return rows
+
+
+# Function to turn commentThreads items into comment store records, keeping comment and parent IDs
+def comment_records(video_id, threads, completed_replies):
+    records = []
+    for item in threads:
+        top = item["snippet"]["topLevelComment"]
+        thread_replies = completed_replies.get(top["id"], item.get("replies", {}).get("comments", []))
+        records.append((top["id"], None, video_id, top["snippet"]["authorDisplayName"], top["snippet"]["textDisplay"],
+                        top["snippet"]["likeCount"], item["snippet"]["totalReplyCount"], top["snippet"]["publishedAt"]))
+        for reply in thread_replies:
+            records.append((reply["id"], top["id"], video_id, reply["snippet"]["authorDisplayName"], reply["snippet"]["textDisplay"],
+                            reply["snippet"]["likeCount"], 0, reply["snippet"]["publishedAt"]))
+    return records